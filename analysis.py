@@ -0,0 +1,216 @@
+import math
+from statistics import NormalDist
+from typing import Optional, List, Callable
+
+import numpy as np
+from fastapi import Query
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+import models
+from dbmodels import Client, CpuInfo, DockerInfo, OsInfo, Result
+from filters import ResultFilter
+from snapshot import ResultSnapshot
+
+HISTOGRAM_BINS = 20
+
+
+class ResultSelector(ResultFilter):
+    """
+    The results on one side of a comparison: those matching a `ResultFilter`, of runners with the given hardware.
+    """
+
+    def __init__(self, cpu_brand: Optional[str], architecture: Optional[str], **filters):
+        super().__init__(**filters)
+        self.cpu_brand = cpu_brand
+        self.architecture = architecture
+
+    def apply(self, query: Select) -> Select:
+        query = super().apply(query)
+        if self.cpu_brand is not None:
+            query = query.where(Result.client_id.in_(
+                select(Client.id).join(Client.cpu).where(CpuInfo.brand == self.cpu_brand)
+            ))
+        if self.architecture is not None:
+            query = query.where(Result.client_id.in_(
+                select(Client.id).outerjoin(Client.docker).outerjoin(Client.os)
+                .where(func.coalesce(DockerInfo.architecture, OsInfo.arch) == self.architecture)
+            ))
+        return query
+
+
+def result_selector(side: str) -> Callable[..., ResultSelector]:
+    """
+    A dependency that reads a `ResultSelector` from query parameters prefixed with `side` and a dot,
+    e.g. `a.implementation`.
+    """
+
+    def dependency(
+            implementation: Optional[str] = Query(None, alias=f"{side}.implementation"),
+            solution: Optional[str] = Query(None, alias=f"{side}.solution"),
+            label: Optional[str] = Query(None, alias=f"{side}.label"),
+            threads: Optional[int] = Query(None, alias=f"{side}.threads"),
+            client_id: Optional[int] = Query(None, alias=f"{side}.client_id", title="Runner ID"),
+            run_id: Optional[str] = Query(None, alias=f"{side}.run_id"),
+            cpu_brand: Optional[str] = Query(None, alias=f"{side}.cpu_brand"),
+            architecture: Optional[str] = Query(None, alias=f"{side}.architecture"),
+            tag: Optional[List[str]] = Query(None, alias=f"{side}.tag",
+                                             title="Only results with all of these tags, as key=value")
+    ) -> ResultSelector:
+        return ResultSelector(
+            cpu_brand, architecture,
+            implementation=implementation, solution=solution, label=label, threads=threads, client_id=client_id,
+            run_id=run_id, submitted_after=None, submitted_before=None, tag=tag,
+        )
+
+    return dependency
+
+
+def _snapshot_mask(snapshot: ResultSnapshot, selector: ResultSelector) -> Optional[np.ndarray]:
+    """
+    The rows of the snapshot the selector selects, or None when it filters on something the snapshot lacks.
+    """
+
+    if selector.run_id is not None or selector.tags or selector.cpu_brand is not None \
+            or selector.architecture is not None or selector.submitted_after is not None \
+            or selector.submitted_before is not None:
+        return None
+
+    columns = snapshot.columns
+    mask = (columns["passes"] > 0) & (columns["duration"] > 0)
+    for column in ("implementation", "solution", "label"):
+        value = getattr(selector, column)
+        if value is not None:
+            code = snapshot.code(column, value)
+            if code is None:
+                return np.zeros(snapshot.rows, dtype=bool)
+            mask &= columns[column] == code
+    if selector.threads is not None:
+        mask &= columns["threads"] == selector.threads
+    if selector.client_id is not None:
+        mask &= columns["client_id"] == selector.client_id
+    return mask
+
+
+async def passes_per_second(
+        db: AsyncSession,
+        selector: ResultSelector,
+        snapshot: Optional[ResultSnapshot] = None) -> np.ndarray:
+    """
+    Fetch the passes per second of the selected results as a single column, sorted. Scans the snapshot, when
+    one is given and has the columns the selector filters on, and queries the database otherwise.
+    """
+
+    mask = _snapshot_mask(snapshot, selector) if snapshot is not None else None
+    if mask is not None:
+        values = snapshot.columns["passes"][mask] / snapshot.columns["duration"][mask]
+    else:
+        query = selector.apply(select(Result.passes / Result.duration)).where(Result.passes > 0, Result.duration > 0)
+        values = np.asarray((await db.execute(query)).scalars().all(), dtype=np.float64)
+    values.sort()
+    return values
+
+
+def _bins(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    values = [side[[0, -1]] for side in (a, b) if len(side)]
+    if not values:
+        return np.empty(0)
+    low, high = np.min(values), np.max(values)
+    if high <= low:
+        high = low * (1 + 1e-9)
+    return np.geomspace(low, high, HISTOGRAM_BINS + 1)
+
+
+def _median_interval(values: np.ndarray, z: float):
+    """
+    A distribution-free confidence interval of the median, between the order statistics whose ranks are
+    a normal approximation of the binomial distribution of the number of values below the median.
+    """
+
+    n = len(values)
+    low = max(math.floor(n / 2 - z * math.sqrt(n) / 2), 1)
+    high = min(math.ceil(n / 2 + z * math.sqrt(n) / 2 + 1), n)
+    return float(values[low - 1]), float(values[high - 1])
+
+
+def describe(values: np.ndarray, bins: np.ndarray, z: float) -> models.Distribution:
+    """
+    Summarize sorted passes per second.
+    """
+
+    histogram = np.histogram(values, bins)[0].tolist() if len(bins) else []
+    if not len(values):
+        return models.Distribution(count=0, histogram=histogram)
+
+    p10, median, p90 = np.percentile(values, [10, 50, 90])
+    median_low, median_high = _median_interval(values, z)
+    return models.Distribution(
+        count=len(values),
+        mean=float(values.mean()),
+        stddev=float(values.std(ddof=1)) if len(values) > 1 else 0.0,
+        min=float(values[0]),
+        p10=float(p10),
+        median=float(median),
+        median_low=median_low,
+        median_high=median_high,
+        p90=float(p90),
+        max=float(values[-1]),
+        histogram=histogram,
+    )
+
+
+def mann_whitney(a: np.ndarray, b: np.ndarray):
+    """
+    The Mann-Whitney U statistic of `b`, and its z-score, with the normal approximation corrected for ties and
+    for continuity. Both are 0 when either side is empty.
+    """
+
+    n_a, n_b = len(a), len(b)
+    n = n_a + n_b
+    if not n_a or not n_b:
+        return 0.0, 0.0
+
+    # Tied values get the average of the ranks they span.
+    unique, inverse, counts = np.unique(np.concatenate((a, b)), return_inverse=True, return_counts=True)
+    ranks = (np.cumsum(counts) - (counts - 1) / 2)[inverse]
+    u = float(ranks[n_a:].sum() - n_b * (n_b + 1) / 2)
+
+    mean = n_a * n_b / 2
+    ties = float(np.sum(counts.astype(np.float64) ** 3 - counts))
+    variance = n_a * n_b / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return u, 0.0
+    z = (u - mean - math.copysign(0.5, u - mean)) / math.sqrt(variance) if u != mean else 0.0
+    return u, z
+
+
+def compare(a: np.ndarray, b: np.ndarray, confidence: float) -> models.Comparison:
+    """
+    Compare two sorted columns of passes per second.
+
+    The confidence interval of the ratio of medians combines those of the medians, on a logarithmic scale.
+    """
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    bins = _bins(a, b)
+    distribution_a, distribution_b = describe(a, bins, z), describe(b, bins, z)
+    comparison = models.Comparison(a=distribution_a, b=distribution_b, bins=bins.tolist(), confidence=confidence)
+    if not len(a) or not len(b):
+        return comparison
+
+    comparison.median_ratio = distribution_b.median / distribution_a.median
+    errors = [
+        (math.log(distribution.median_high) - math.log(distribution.median_low)) / (2 * z)
+        for distribution in (distribution_a, distribution_b)
+    ]
+    error = math.hypot(*errors)
+    comparison.median_ratio_low = comparison.median_ratio * math.exp(-z * error)
+    comparison.median_ratio_high = comparison.median_ratio * math.exp(z * error)
+
+    u, u_z = mann_whitney(a, b)
+    comparison.mann_whitney_u = u
+    comparison.z = u_z
+    comparison.p_value = math.erfc(abs(u_z) / math.sqrt(2))
+    comparison.probability_b_faster = u / (len(a) * len(b))
+    return comparison
@@ -0,0 +1,87 @@
+import asyncio
+import gzip
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import List, Dict, Any, Set
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import leaderboard
+import models
+import runner_stats
+from dbmodels import Result, ResultTag
+from serialization import result_query, result_dicts, dumps
+from versioning import bump_version, bump_deletions
+
+# Number of results moved per transaction.
+CHUNK_SIZE = 1000
+
+
+def archive_path(directory: str, submitted_at: datetime) -> str:
+    return os.path.join(directory, f"results-{submitted_at:%Y-%m}.ndjson.gz")
+
+
+def _append(directory: str, rows: List[Dict[str, Any]]) -> Set[str]:
+    months: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for row in rows:
+        months[archive_path(directory, row["submitted_at"])].append(row)
+
+    os.makedirs(directory, exist_ok=True)
+    for path, month in months.items():
+        # Every append adds a gzip member, and a file of concatenated members reads as one stream.
+        with open(path, "ab") as file:
+            with gzip.GzipFile(fileobj=file, mode="wb") as archive:
+                archive.write(b"".join(dumps(row) + b"\n" for row in month))
+            file.flush()
+            os.fsync(file.fileno())
+
+    return set(months)
+
+
+async def archive_results(db: AsyncSession, before: datetime, directory: str) -> models.ArchiveStatus:
+    """
+    Move results submitted before `before` out of the database, into a gzipped newline-delimited JSON file per
+    month of submission, in the format of `GET /results/export`. Results without a submission time, which
+    predate it being recorded, stay in the database.
+
+    Every chunk is written and synced to its files before it is deleted, so a failure can leave a chunk in
+    both places, but never in neither. The leaderboard groups and the result summaries of the runners the
+    results were accounted in are recomputed once all chunks are moved. When archiving is interrupted before,
+    `POST /leaderboard/rebuild` recomputes them.
+    """
+
+    archived = 0
+    files: Set[str] = set()
+    groups: Set[leaderboard.GroupKey] = set()
+    client_ids: Set[int] = set()
+    while True:
+        rows = (await db.execute(
+            result_query().where(Result.submitted_at < before).order_by(Result.id).limit(CHUNK_SIZE)
+        )).all()
+        if not rows:
+            break
+
+        chunk = await result_dicts(db, rows)
+        files |= await asyncio.to_thread(_append, directory, chunk)
+
+        ids = [row["id"] for row in chunk]
+        groups |= await db.run_sync(leaderboard.groups, Result.id.in_(ids))
+        client_ids |= {row["client_id"] for row in chunk if row["client_id"] is not None}
+        await db.execute(
+            delete(ResultTag).where(ResultTag.result_id.in_(ids)).execution_options(synchronize_session=False)
+        )
+        await db.execute(delete(Result).where(Result.id.in_(ids)).execution_options(synchronize_session=False))
+        await db.execute(bump_deletions)
+        await db.commit()
+        archived += len(ids)
+
+    if archived:
+        # Recomputing reads all results left in the groups, which is too slow to do for every chunk.
+        await db.run_sync(leaderboard.refresh, groups)
+        await db.run_sync(runner_stats.rebuild, client_ids)
+        await db.execute(bump_version)
+        await db.commit()
+
+    return models.ArchiveStatus(archived=archived, files=sorted(files))
@@ -1,22 +1,58 @@
-from typing import Optional
+import hashlib
+import hmac
+import secrets
+from typing import Optional, NamedTuple, Tuple
 
 from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, HTTPBasic, HTTPBasicCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.status import HTTP_403_FORBIDDEN
 
+import hash
+from cache import TTLCache
+from config import settings
 from db import database
 from dbmodels import Admin, Client
 
 
-def client_auth(
+class ClientIdentity(NamedTuple):
+    """
+    The minimal information about an authenticated runner. Handlers that need more load the `Client` themselves.
+    """
+
+    id: int
+    owner_id: int
+
+
+client_cache: TTLCache[str, ClientIdentity] = TTLCache(settings.auth_cache_size, settings.auth_cache_ttl)
+
+
+def invalidate_client_token(token: Optional[str]):
+    """
+    Must be called whenever a token stops being valid, i.e. when its runner is removed, or its token replaced.
+    """
+
+    if token is not None:
+        client_cache.invalidate(token)
+
+
+async def client_auth(
         bearer: HTTPAuthorizationCredentials = Depends(HTTPBearer(scheme_name="Client Token")),
-        db: Session = Depends(database)) -> Client:
+        db: AsyncSession = Depends(database)) -> ClientIdentity:
+
+    identity = client_cache.get(bearer.credentials)
+    if identity is not None:
+        return identity
 
-    client: Optional[Client] = db.query(Client).filter(Client.token == bearer.credentials).one_or_none()
+    row = (await db.execute(
+        select(Client.id, Client.owner_id).where(Client.token == bearer.credentials)
+    )).one_or_none()
 
-    if client is not None:
-        return client
+    if row is not None:
+        identity = ClientIdentity(*row)
+        client_cache.set(bearer.credentials, identity)
+        return identity
 
     raise HTTPException(
         status_code=HTTP_403_FORBIDDEN,
@@ -24,20 +60,46 @@ def client_auth(
     )
 
 
-def admin_auth(
+# Verified administrator credentials, by username: the password hash they were verified against, and a keyed
+# digest of the password. The digest key only exists in memory, so the digests are useless outside this process.
+admin_cache: TTLCache[str, Tuple[str, bytes]] = TTLCache(settings.admin_cache_size, settings.admin_cache_ttl)
+_admin_cache_key = secrets.token_bytes(32)
+
+
+def _credential_digest(password: str) -> bytes:
+    return hmac.new(_admin_cache_key, password.encode("utf-8"), hashlib.sha256).digest()
+
+
+def _is_cached_admin(admin: Admin, password: str) -> bool:
+    cached = admin_cache.get(admin.username)
+    if cached is None:
+        return False
+
+    password_hash, digest = cached
+    # A password hash changed in the database invalidates the entry.
+    return password_hash == admin.password_hash and hmac.compare_digest(digest, _credential_digest(password))
+
+
+async def admin_auth(
         creds: HTTPBasicCredentials = Depends(HTTPBasic(scheme_name="Admin Token")),
-        db: Session = Depends(database)) -> Admin:
+        db: AsyncSession = Depends(database)) -> Admin:
 
-    admin: Optional[Admin] = db.query(Admin).filter(Admin.username == creds.username).one_or_none()
+    admin: Optional[Admin] = (await db.execute(
+        select(Admin).where(Admin.username == creds.username)
+    )).scalar_one_or_none()
 
     if admin is not None:
+        if _is_cached_admin(admin, creds.password):
+            return admin
+
         old_hash = admin.password_hash
 
-        if admin.check_password(creds.password):
+        if await hash.run_in_hasher_pool(admin.check_password, creds.password):
             if admin.password_hash is not old_hash:
                 db.add(admin)
                 # Ensure that a commit happens. If the client doesn't want autocommit, he must disable it again.
-                db.commit()
+                await db.commit()
+            admin_cache.set(admin.username, (admin.password_hash, _credential_digest(creds.password)))
             return admin
 
     raise HTTPException(
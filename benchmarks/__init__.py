@@ -0,0 +1,23 @@
+import os
+import sys
+import tempfile
+from typing import Optional
+
+_directory: Optional[tempfile.TemporaryDirectory] = None
+
+
+def use_benchmark_database():
+    """
+    Point the application at the database a `--database` argument names, or else at a temporary SQLite database,
+    which is removed when the process exits. The application reads the setting when its modules are imported, so
+    this must be called before.
+    """
+
+    global _directory
+    arguments = sys.argv[1:]
+    if "--database" in arguments:
+        os.environ["AGGREGATOR_DATABASE_URL"] = arguments[arguments.index("--database") + 1]
+        return
+
+    _directory = tempfile.TemporaryDirectory()
+    os.environ["AGGREGATOR_DATABASE_URL"] = f"sqlite:///{_directory.name}/benchmark.db"
@@ -0,0 +1,240 @@
+"""
+Load-test the service in-process: seed runners and results through the API, then drive concurrent simulated
+runners, which publish results, and dashboard readers, which list results, runners and the leaderboard.
+Reports the latency percentiles and throughput of every endpoint, and can save them as a baseline, or compare
+them against one to catch regressions.
+
+Requests go through the ASGI application directly, so the figures cover the service and its database, but not
+the HTTP server. The database is a temporary SQLite database, unless `--database` names another one, which must
+be empty.
+
+Run from the repository root:
+
+    pipenv run python -m benchmarks.load --save baseline.json
+    pipenv run python -m benchmarks.load --compare baseline.json
+"""
+import argparse
+import asyncio
+import base64
+import copy
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Any
+
+from benchmarks import use_benchmark_database
+
+# The load is measured against an empty database of the benchmark's own, never the one the service is set up with.
+use_benchmark_database()
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from db import engine, Base  # noqa: E402
+from dbmodels import Admin, DataVersion  # noqa: E402
+
+ADMIN_PASSWORD = "benchmark"
+ADMIN = {"Authorization": "Basic " + base64.b64encode(f"admin:{ADMIN_PASSWORD}".encode()).decode()}
+
+META = {
+    "cpu": {
+        "manufacturer": "AMD", "brand": "Ryzen 9 5950X", "vendor": "AuthenticAMD", "family": "25", "model": "33",
+        "speed": 3.4, "speedMax": 4.9, "cores": 32, "physicalCores": 16, "processors": 1, "flags": "sse sse2 avx2",
+        "virtualization": True, "cache": {"l1d": 524288, "l1i": 524288, "l2": 8388608, "l3": 67108864},
+    },
+    "os": {
+        "platform": "linux", "distro": "Ubuntu", "release": "20.04", "kernel": "5.4.0", "arch": "x64",
+        "codepage": "UTF-8", "logofile": "ubuntu", "build": "", "uefi": True,
+    },
+    "system": {"manufacturer": "ASUS", "model": "System Product Name", "virtual": False, "raspberry": None},
+    "docker": {
+        "kernelVersion": "5.4.0", "operatingSystem": "Docker Desktop", "osVersion": "20.04", "osType": "linux",
+        "architecture": "x86_64", "ncpu": 32, "memTotal": 67108864, "serverVersion": "20.10.7",
+    },
+}
+IMPLEMENTATIONS = ["c", "cpp", "rust", "zig", "go", "csharp", "java", "python", "javascript", "haskell"]
+
+
+def meta(runner: int) -> Dict[str, Any]:
+    # A few hardware profiles, shared by many runners, as in a real fleet.
+    properties = copy.deepcopy(META)
+    properties["cpu"]["brand"] = f"Benchmark CPU {runner % 4}"
+    properties["os"]["release"] = f"20.{runner % 3}"
+    return properties
+
+
+def result(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "implementation": rng.choice(IMPLEMENTATIONS),
+        "solution": str(rng.randint(1, 3)),
+        "label": "benchmark",
+        "passes": rng.randint(1000, 20000),
+        "duration": round(rng.uniform(5.0, 5.1), 4),
+        "threads": rng.choice([1, 1, 1, 8, 16]),
+        "tags": {"algorithm": rng.choice(["base", "wheel", "other"]), "faithful": rng.choice(["yes", "no"])},
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies[name].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{name} failed with {response.status_code}: {response.text}")
+        return response
+
+
+async def prepare():
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.execute(Admin.__table__.insert().values(username="admin", password_hash="{" + ADMIN_PASSWORD))
+        await connection.execute(DataVersion.__table__.insert().values(id=1, version=1))
+
+
+async def seed(client: httpx.AsyncClient, recorder: Recorder, runners: int, results: int, rng: random.Random):
+    tokens = []
+    for runner in range(runners):
+        token = (await recorder.request(client, "POST /runners", "POST", "/runners", headers=ADMIN)).json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        await recorder.request(client, "PATCH /runners", "PATCH", "/runners", json=meta(runner), headers=headers)
+        tokens.append(token)
+
+    per_runner = results // runners
+    for token in tokens:
+        await recorder.request(
+            client, "POST /results/batch", "POST", "/results/batch",
+            json=[result(rng) for _ in range(per_runner)], headers={"Authorization": f"Bearer {token}"},
+        )
+    return tokens
+
+
+async def simulated_runner(client: httpx.AsyncClient, recorder: Recorder, runner: int, token: str, requests: int,
+                           rng: random.Random):
+    headers = {"Authorization": f"Bearer {token}"}
+    # Runners report their properties when they start, which almost never changes them.
+    await recorder.request(client, "PATCH /runners", "PATCH", "/runners", json=meta(runner), headers=headers)
+    for _ in range(requests):
+        await recorder.request(client, "POST /results", "POST", "/results", json=result(rng), headers=headers)
+
+
+async def dashboard_reader(client: httpx.AsyncClient, recorder: Recorder, requests: int, rng: random.Random):
+    for _ in range(requests):
+        implementation = rng.choice(IMPLEMENTATIONS)
+        name, method, url, kwargs = rng.choice([
+            ("GET /results", "GET", "/results", {"params": {"limit": 100, "implementation": implementation}}),
+            ("GET /leaderboard", "GET", "/leaderboard", {}),
+            ("GET /runners", "GET", "/runners", {"params": {"results": "summary"}, "headers": ADMIN}),
+            ("GET /results/compare", "GET", "/results/compare",
+             {"params": {"a.implementation": implementation, "b.implementation": rng.choice(IMPLEMENTATIONS)}}),
+        ])
+        await recorder.request(client, name, method, url, **kwargs)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def summarize(latencies: Dict[str, List[float]], elapsed: float) -> Dict[str, Dict[str, float]]:
+    summary = {}
+    for name, values in sorted(latencies.items()):
+        values = sorted(values)
+        summary[name] = {
+            "count": len(values),
+            "throughput": len(values) / elapsed,
+            "p50_ms": percentile(values, 0.5) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+        }
+    return summary
+
+
+def report(title: str, summary: Dict[str, Dict[str, float]]):
+    print(title)
+    print(f"  {'endpoint':<24} {'count':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, figures in summary.items():
+        print(f"  {name:<24} {figures['count']:>7} {figures['throughput']:>9.1f} "
+              f"{figures['p50_ms']:>9.2f} {figures['p99_ms']:>9.2f}")
+
+
+def regressions(summary: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                tolerance: float) -> List[str]:
+    found = []
+    for name, figures in summary.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        for key in ("p50_ms", "p99_ms"):
+            if figures[key] > before[key] * (1 + tolerance):
+                found.append(f"{name}: {key} went from {before[key]:.2f} to {figures[key]:.2f}")
+        if figures["throughput"] < before["throughput"] * (1 - tolerance):
+            found.append(f"{name}: throughput went from {before['throughput']:.1f} to {figures['throughput']:.1f}")
+    return found
+
+
+async def run(arguments: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(arguments.seed)
+    await prepare()
+    await main.app.router.startup()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        seeding = Recorder()
+        start = time.perf_counter()
+        tokens = await seed(client, seeding, arguments.runners, arguments.results, rng)
+        report("Seeding", summarize(seeding.latencies, time.perf_counter() - start))
+
+        load = Recorder()
+        tasks = [
+            simulated_runner(client, load, runner, tokens[runner], arguments.requests, random.Random(rng.random()))
+            for runner in range(arguments.concurrent_runners)
+        ] + [
+            dashboard_reader(client, load, arguments.requests, random.Random(rng.random()))
+            for _ in range(arguments.readers)
+        ]
+        start = time.perf_counter()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+        summary = summarize(load.latencies, elapsed)
+        report(f"Load: {arguments.concurrent_runners} runners, {arguments.readers} readers, {elapsed:.2f} s", summary)
+
+    await main.app.router.shutdown()
+    await engine.dispose()
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", help="SQLAlchemy URL of an empty database, instead of a temporary SQLite one")
+    parser.add_argument("--runners", type=int, default=50, help="Number of runners to register")
+    parser.add_argument("--results", type=int, default=20000, help="Number of results to seed")
+    parser.add_argument("--concurrent-runners", type=int, default=20, help="Number of simulated runners, out of the registered ones")
+    parser.add_argument("--readers", type=int, default=10, help="Number of simulated dashboard readers")
+    parser.add_argument("--requests", type=int, default=50, help="Number of requests per runner and reader")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", metavar="FILE", help="Save the figures as a JSON baseline")
+    parser.add_argument("--compare", metavar="FILE", help="Compare the figures with a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Fraction by which latency may grow, or throughput shrink, before it is a regression")
+    arguments = parser.parse_args()
+    if arguments.concurrent_runners > arguments.runners:
+        # Every simulated runner reports as one of the registered runners, with the same properties.
+        parser.error("--concurrent-runners cannot exceed --runners")
+
+    figures = asyncio.run(run(arguments))
+
+    if arguments.save:
+        with open(arguments.save, "w") as file:
+            json.dump({"parameters": vars(arguments), "endpoints": figures}, file, indent=2)
+
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            baseline = json.load(file)["endpoints"]
+        found = regressions(figures, baseline, arguments.tolerance)
+        for regression in found:
+            print(f"Regression: {regression}")
+        sys.exit(1 if found else 0)
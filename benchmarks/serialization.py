@@ -0,0 +1,88 @@
+"""
+Measure the time per result spent turning result rows into a JSON response: the ORM path, which builds a
+`models.Result` for every row, validates it again against the response model and runs `jsonable_encoder`, against
+the plain-row path that GET /results uses, which selects column tuples and encodes them with orjson.
+
+Run from the repository root: `pipenv run python -m benchmarks.serialization --rows 20000`
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+from benchmarks import use_benchmark_database
+
+# The rows are seeded into a scratch database, rather than read from the one the service is set up with.
+use_benchmark_database()
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import parse_obj_as  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+import models  # noqa: E402
+from db import engine, SessionLocal, Base  # noqa: E402
+from dbmodels import Client, Result, ResultTag  # noqa: E402
+from serialization import result_query, result_dicts, dumps  # noqa: E402
+
+
+async def seed(rows: int):
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.execute(Client.__table__.insert().values(id=1, token="benchmark"))
+        await connection.execute(Result.__table__.insert(), [
+            {
+                "id": index + 1, "implementation": f"impl{index % 50}", "solution": str(index % 3 + 1),
+                "label": "benchmark", "passes": 1000 + index, "duration": 5.0 + index % 7, "threads": 1 + index % 8,
+                "client_id": 1,
+            }
+            for index in range(rows)
+        ])
+        await connection.execute(ResultTag.__table__.insert(), [
+            {"result_id": index + 1, "key": key, "value": value}
+            for index in range(rows)
+            for key, value in (("algorithm", "base"), ("faithful", "yes"), ("bits", "1"))
+        ])
+
+
+async def orm_path() -> bytes:
+    async with SessionLocal() as db:
+        results: List[Result] = (await db.execute(select(Result).order_by(Result.id))).scalars().all()
+        payload = [models.Result.from_orm(result) for result in results]
+        # What FastAPI does with a returned list of models when the route has a response_model.
+        validated = parse_obj_as(List[models.Result], [result.dict() for result in payload])
+        return json.dumps(jsonable_encoder(validated)).encode("utf-8")
+
+
+async def row_path() -> bytes:
+    async with SessionLocal() as db:
+        rows = (await db.execute(result_query().order_by(Result.id))).all()
+        return dumps(await result_dicts(db, rows))
+
+
+async def measure(name: str, path, rows: int, repeat: int):
+    await path()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await path()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(f"{name:>6}: {best * 1000:8.1f} ms for {rows} rows, {best / rows * 1e6:6.2f} µs per row")
+    return best
+
+
+async def main(rows: int, repeat: int):
+    await seed(rows)
+    orm = await measure("orm", orm_path, rows, repeat)
+    plain = await measure("rows", row_path, rows, repeat)
+    print(f"speedup: {orm / plain:.1f}x")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    arguments = parser.parse_args()
+    asyncio.run(main(arguments.rows, arguments.repeat))
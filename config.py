@@ -0,0 +1,70 @@
+import os
+from typing import Optional
+
+from pydantic import BaseSettings
+
+
+class Settings(BaseSettings):
+    """
+    Service configuration. Every setting can be overridden by an environment variable with the same name,
+    upper-cased and prefixed with `AGGREGATOR_`, for example `AGGREGATOR_AUTH_CACHE_TTL=30`.
+    """
+
+    database_url: str = "sqlite+aiosqlite:///./app.db"
+    "SQLAlchemy database URL. Plain `sqlite://` and `postgresql://` URLs are given an asyncio driver."
+    database_pool_size: int = 5
+    "Number of database connections kept open."
+    database_max_overflow: int = 10
+    "Number of additional database connections opened under load, on top of the pool size."
+    database_pool_timeout: float = 30.0
+    "Seconds to wait for a free database connection before failing the request."
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    "Bytes of a SQLite database file that are memory-mapped."
+    sqlite_cache_size: int = 64 * 1024
+    "Kibibytes of page cache per SQLite connection."
+    sqlite_busy_timeout: int = 5000
+    "Milliseconds a SQLite writer waits for the write lock before failing."
+
+    auth_cache_size: int = 10000
+    "Maximum number of runner tokens kept in the authentication cache."
+    auth_cache_ttl: float = 60.0
+    "Seconds a cached runner token stays valid before it is looked up in the database again."
+    admin_cache_size: int = 100
+    "Maximum number of verified administrator credentials kept in memory."
+    admin_cache_ttl: float = 30.0
+    "Seconds a verified administrator password is accepted without running the password hasher again."
+    hasher_workers: int = max(1, (os.cpu_count() or 1) // 2)
+    "Number of threads reserved for password hashing, so it cannot starve the request threads."
+    response_cache_size: int = 256
+    "Maximum number of serialized responses of read endpoints kept in memory."
+    response_cache_ttl: float = 300.0
+    "Seconds a serialized response is kept, even if the data it was made from did not change."
+
+    ingest_queue: bool = False
+    "Acknowledge results once they are journaled, with `202 Accepted`, and store them in the background, in batches."
+    ingest_queue_size: int = 10000
+    "Maximum number of submissions waiting to be stored, beyond which runners are asked to retry later."
+    ingest_batch_size: int = 500
+    "Maximum number of submissions stored in a single transaction."
+    ingest_journal: str = "./ingest.journal"
+    "File in which queued submissions are journaled until they are stored. Every worker process needs its own."
+    archive_directory: str = "./archive"
+    "Directory to which old results are archived, in a file per month."
+    slow_request_seconds: Optional[float] = None
+    "When set, requests taking at least this many seconds are logged, with the SQL they executed."
+    job_lease_seconds: float = 300.0
+    "Seconds a runner may go without a heartbeat before its job is handed to another runner."
+    job_poll_seconds: float = 5.0
+    "Seconds between checks for expired leases while a runner waits for a job."
+    snapshot_directory: Optional[str] = None
+    "When set, analyses read a columnar snapshot of the results kept in this directory. Every worker needs its own."
+    feed_buffer_size: int = 1000
+    "Maximum number of results buffered for a live feed subscriber, beyond which the oldest are dropped."
+    feed_keepalive_seconds: float = 15.0
+    "Seconds of silence after which a live feed sends a comment, to keep proxies from closing the connection."
+
+    class Config:
+        env_prefix = "AGGREGATOR_"
+
+
+settings = Settings()
@@ -1,21 +1,135 @@
-from typing import Generator
+import asyncio
+import sqlite3
+import weakref
+from typing import AsyncGenerator, Dict, Any, Optional
 
-from sqlalchemy import create_engine
+from sqlalchemy import event, exc
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.util import await_only
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
+import metrics
+from config import settings
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+}
+SYNC_DRIVERS = {
+    "sqlite+aiosqlite": "sqlite",
+    "postgresql+asyncpg": "postgresql",
+}
+
+
+def async_url(url: str) -> str:
+    scheme, separator, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + separator + rest
+
+
+def sync_url(url: str) -> str:
+    """
+    The URL with a blocking driver, for tools such as Alembic which don't use asyncio.
+    """
+
+    scheme, separator, rest = async_url(url).partition("://")
+    return SYNC_DRIVERS.get(scheme, scheme) + separator + rest
+
+
+SQLALCHEMY_DATABASE_URL = async_url(settings.database_url)
+
+
+def engine_options(url: str) -> Dict[str, Any]:
+    options = {
+        "pool_size": settings.database_pool_size,
+        "max_overflow": settings.database_max_overflow,
+        "pool_timeout": settings.database_pool_timeout,
+    }
+
+    if make_url(url).get_backend_name() == "sqlite":
+        # SQLAlchemy doesn't pool SQLite file connections by default, reopening the database for every session.
+        options["poolclass"] = AsyncAdaptedQueuePool
+    else:
+        options["pool_pre_ping"] = True
+
+    return options
+
+
+def _configure_sqlite(dbapi_connection, _connection_record):
+    cursor = dbapi_connection.cursor()
+    # With a write-ahead log, readers no longer block on, or are blocked by, the writer.
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # In WAL mode, NORMAL is still safe against corruption, only the last commits may be lost on power loss.
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_size)}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout)}")
+    # SQLite only enforces foreign keys, and cascades deletes along them, when asked to, per connection.
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
 
 
-def database() -> Generator[SessionLocal, None, None]:
-    db = SessionLocal()
+# SQLite allows a single writer at a time. Writers waiting for it poll in SQLite's busy handler, which is unfair,
+# so under load some of them wait until the busy timeout passes, and fail. The writers of a process queue for
+# this lock instead, in order, from their first write until their transaction ends, and fail as SQLite would
+# once they waited for the busy timeout. Locks are per event loop.
+_writer_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+
+
+def _acquire_writer_lock(connection, _cursor, statement, parameters, context, _executemany):
+    if "writer_lock" in connection.info or context is None:
+        return
+    if not (context.isinsert or context.isupdate or context.isdelete):
+        return
+
+    loop = asyncio.get_running_loop()
+    lock = _writer_locks.get(loop)
+    if lock is None:
+        lock = _writer_locks[loop] = asyncio.Lock()
     try:
+        # Events run in the greenlet of the awaiting statement, which can await on its behalf.
+        await_only(asyncio.wait_for(lock.acquire(), settings.sqlite_busy_timeout / 1000))
+    except asyncio.TimeoutError:
+        raise exc.OperationalError(statement, parameters, sqlite3.OperationalError("database is locked")) from None
+    connection.info["writer_lock"] = lock
+
+
+def _release_writer_lock(connection):
+    lock = connection.info.pop("writer_lock", None)
+    if lock is not None:
+        lock.release()
+
+
+engine = create_async_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
+if engine.dialect.name == "sqlite":
+    event.listen(engine.sync_engine, "connect", _configure_sqlite)
+    event.listen(engine.sync_engine, "before_cursor_execute", _acquire_writer_lock)
+    event.listen(engine.sync_engine, "commit", _release_writer_lock)
+    event.listen(engine.sync_engine, "rollback", _release_writer_lock)
+event.listen(engine.sync_engine, "before_cursor_execute", metrics.before_cursor_execute)
+event.listen(engine.sync_engine, "after_cursor_execute", metrics.after_cursor_execute)
+event.listen(engine.sync_engine, "handle_error", metrics.handle_error)
+
+SessionLocal = sessionmaker(engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False)
+Base = declarative_base()
+
+
+def conflict_insert(dialect: str, table) -> Optional[Any]:
+    """
+    An INSERT into `table` that supports ON CONFLICT clauses, or None on databases that don't.
+    """
+
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    return None
+
+
+async def database() -> AsyncGenerator[AsyncSession, None]:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
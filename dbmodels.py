@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, PickleType, Float, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Float, Boolean, DateTime, Index, UniqueConstraint, JSON, func
+from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.orm import relationship
+from sqlalchemy.orm.collections import attribute_mapped_collection
 
 import hash
 from db import Base
@@ -25,21 +27,27 @@ class Admin(Base):
         return True
 
 
+# The hardware and operating system tables below are content-addressed by `hash`. A row is shared by all runners that
+# report the same properties, and is never updated in place. See `hardware.store_system_info`.
+
+
 class CacheInfo(Base):
     __tablename__ = "cache_info"
     id = Column(Integer, primary_key=True, index=True)
+    hash = Column(String(64), unique=True, index=True)
 
     l1d = Column(Integer)
     l1i = Column(Integer)
     l2 = Column(Integer)
     l3 = Column(Integer)
 
-    cpu = relationship("CpuInfo", uselist=False, back_populates="cache")
+    cpus = relationship("CpuInfo", uselist=True, back_populates="cache")
 
 
 class CpuInfo(Base):
     __tablename__ = "cpu_info"
     id = Column(Integer, primary_key=True, index=True)
+    hash = Column(String(64), unique=True, index=True)
 
     manufacturer = Column(String)
     brand = Column(String)
@@ -59,18 +67,19 @@ class CpuInfo(Base):
     performanceCores = Column(Integer)
     processors = Column(Integer)
     socket = Column(String)
-    flags = Column(PickleType)
+    flags = Column(String)
     virtualization = Column(Boolean)
 
     cache_id = Column(Integer, ForeignKey(CacheInfo.id), index=True)
-    cache = relationship(CacheInfo, uselist=False, back_populates="cpu")
+    cache = relationship(CacheInfo, uselist=False, back_populates="cpus")
 
-    client = relationship("Client", uselist=False, back_populates="cpu")
+    clients = relationship("Client", uselist=True, back_populates="cpu")
 
 
 class OsInfo(Base):
     __tablename__ = "os_info"
     id = Column(Integer, primary_key=True, index=True)
+    hash = Column(String(64), unique=True, index=True)
 
     platform = Column(String)
     distro = Column(String)
@@ -86,24 +95,26 @@ class OsInfo(Base):
     hypervisor = Column(Boolean)
     remoteSession = Column(Boolean)
 
-    client = relationship("Client", uselist=False, back_populates="os")
+    clients = relationship("Client", uselist=True, back_populates="os")
 
 
 class RaspberryInfo(Base):
     __tablename__ = "raspberry_info"
     id = Column(Integer, primary_key=True, index=True)
+    hash = Column(String(64), unique=True, index=True)
 
     manufacturer = Column(String)
     processor = Column(String)
     type = Column(String)
     revision = Column(String)
 
-    system = relationship("SystemInfo", uselist=False, back_populates="raspberry")
+    systems = relationship("SystemInfo", uselist=True, back_populates="raspberry")
 
 
 class SystemInfo(Base):
     __tablename__ = "system_info"
     id = Column(Integer, primary_key=True, index=True)
+    hash = Column(String(64), unique=True, index=True)
 
     manufacturer = Column(String)
     model = Column(String)
@@ -113,14 +124,15 @@ class SystemInfo(Base):
     virtualHost = Column(String)
 
     raspberry_id = Column(Integer, ForeignKey(RaspberryInfo.id), index=True)
-    raspberry = relationship(RaspberryInfo, uselist=False, back_populates="system")
+    raspberry = relationship(RaspberryInfo, uselist=False, back_populates="systems")
 
-    client = relationship("Client", uselist=False, back_populates="system")
+    clients = relationship("Client", uselist=True, back_populates="system")
 
 
 class DockerInfo(Base):
     __tablename__ = "docker_info"
     id = Column(Integer, primary_key=True, index=True)
+    hash = Column(String(64), unique=True, index=True)
 
     kernelVersion = Column(String)
     operatingSystem = Column(String)
@@ -131,30 +143,38 @@ class DockerInfo(Base):
     memTotal = Column(Integer)
     serverVersion = Column(String)
 
-    client = relationship("Client", uselist=False, back_populates="docker")
+    clients = relationship("Client", uselist=True, back_populates="docker")
 
 
 class Client(Base):
     __tablename__ = "clients"
     id = Column(Integer, primary_key=True, index=True)
     token = Column(String, unique=True, index=True)
+    meta_hash = Column(String(64))
+    "SHA-256 of the system properties the runner reported last."
+
+    # Maintained as results are published, so listing runners doesn't scan their results.
+    result_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_result_id = Column(Integer)
+    last_submitted_at = Column(DateTime)
 
-    results = relationship("Result", uselist=True, back_populates="client")
+    # Results, their tags and the runner's bests are deleted with the runner by the database.
+    results = relationship("Result", uselist=True, back_populates="client", passive_deletes=True)
 
     owner_id = Column(Integer, ForeignKey(Admin.id), index=True)
     owner = relationship(Admin, uselist=False, back_populates="clients")
 
     system_id = Column(Integer, ForeignKey(SystemInfo.id), index=True)
-    system = relationship(SystemInfo, uselist=False, back_populates="client")
+    system = relationship(SystemInfo, uselist=False, back_populates="clients")
 
     os_id = Column(Integer, ForeignKey(OsInfo.id), index=True)
-    os = relationship(OsInfo, uselist=False, back_populates="client")
+    os = relationship(OsInfo, uselist=False, back_populates="clients")
 
     cpu_id = Column(Integer, ForeignKey(CpuInfo.id), index=True)
-    cpu = relationship(CpuInfo, uselist=False, back_populates="client")
+    cpu = relationship(CpuInfo, uselist=False, back_populates="clients")
 
     docker_id = Column(Integer, ForeignKey(DockerInfo.id), index=True)
-    docker = relationship(DockerInfo, uselist=False, back_populates="client")
+    docker = relationship(DockerInfo, uselist=False, back_populates="clients")
 
 
 class Result(Base):
@@ -166,7 +186,138 @@ class Result(Base):
     passes = Column(Integer)
     duration = Column(Float)
     threads = Column(Integer)
-    tags = Column(PickleType)
-
-    client_id = Column(Integer, ForeignKey(Client.id), index=True)
+    submitted_at = Column(DateTime, default=func.now(), index=True)
+    run_id = Column(String(64), index=True)
+    idempotency_key = Column(String(64))
+    "Under which the runner stored the result, so that retrying the submission doesn't store it again."
+    cpu_brand = Column(String, nullable=False, default="", server_default="")
+    architecture = Column(String, nullable=False, default="", server_default="")
+    "The hardware of the runner when it submitted the result, which the leaderboard groups the result by."
+
+    client_id = Column(Integer, ForeignKey(Client.id, ondelete="CASCADE"), index=True)
     client = relationship(Client, uselist=False, back_populates="results")
+
+    tag_rows = relationship(
+        "ResultTag",
+        collection_class=attribute_mapped_collection("key"),
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        lazy="selectin",
+    )
+    tags = association_proxy("tag_rows", "value", creator=lambda key, value: ResultTag(key=key, value=value))
+
+    __table_args__ = (
+        # Keyset pagination orders by id, so every filterable column is paired with it.
+        Index("ix_results_implementation_solution_id", implementation, solution, id),
+        Index("ix_results_label_id", label, id),
+        Index("ix_results_client_id_id", client_id, id),
+        # For what a runner submitted within a period of time.
+        Index("ix_results_client_id_submitted_at", client_id, submitted_at),
+        Index("ix_results_client_id_idempotency_key", client_id, idempotency_key, unique=True),
+        # Otherwise SQLite reuses the ids of the latest results once they are deleted, and readers that keep
+        # track of the last id they saw would miss new results.
+        {"sqlite_autoincrement": True},
+    )
+
+
+class ResultTag(Base):
+    __tablename__ = "result_tags"
+    result_id = Column(Integer, ForeignKey(Result.id, ondelete="CASCADE"), primary_key=True)
+    key = Column(String, primary_key=True)
+    value = Column(String)
+
+    __table_args__ = (
+        Index("ix_result_tags_key_value_result_id", key, value, result_id),
+    )
+
+
+class LeaderboardEntry(Base):
+    """
+    Aggregated passes per second of all results of one implementation, solution, label and thread count,
+    on one CPU brand and architecture. Maintained incrementally as results are published.
+    """
+
+    __tablename__ = "leaderboard"
+    id = Column(Integer, primary_key=True, index=True)
+
+    implementation = Column(String, nullable=False)
+    solution = Column(String, nullable=False)
+    label = Column(String, nullable=False)
+    threads = Column(Integer, nullable=False)
+    cpu_brand = Column(String, nullable=False)
+    architecture = Column(String, nullable=False)
+
+    result_count = Column(Integer, nullable=False)
+    best_passes_per_second = Column(Float, index=True)
+    best_result_id = Column(Integer)
+    mean_passes_per_second = Column(Float, nullable=False)
+    m2_passes_per_second = Column(Float, nullable=False)
+    "Sum of squared deviations from the mean, from which the variance follows."
+    histogram = Column(JSON, nullable=False)
+    "Result counts by logarithmic passes per second bucket, from which percentiles follow."
+
+    __table_args__ = (
+        UniqueConstraint(implementation, solution, label, threads, cpu_brand, architecture,
+                         name="uq_leaderboard_group"),
+    )
+
+
+class RunnerBest(Base):
+    """
+    The best passes per second of a runner for one implementation. Maintained as results are published.
+    """
+
+    __tablename__ = "runner_bests"
+    client_id = Column(Integer, ForeignKey(Client.id, ondelete="CASCADE"), primary_key=True)
+    implementation = Column(String, primary_key=True)
+    best_passes_per_second = Column(Float, nullable=False)
+    best_result_id = Column(Integer, nullable=False)
+
+
+class Job(Base):
+    """
+    A benchmark run to be dispatched to a runner. Runners lease jobs, and a job whose lease expires without
+    being completed is handed out again, until it runs out of attempts.
+    """
+
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True, index=True)
+
+    implementation = Column(String, nullable=False)
+    solution = Column(String)
+    arguments = Column(JSON, nullable=False)
+    threads = Column(Integer, nullable=False)
+    "Number of CPUs the job occupies on the runner."
+    architecture = Column(String)
+    "Architecture the job must run on, as reported by runners, or any when not set."
+    priority = Column(Integer, nullable=False)
+    run_id = Column(String(64), nullable=False, unique=True)
+    "Run id of the results the job produces."
+
+    status = Column(String, nullable=False)
+    attempts = Column(Integer, nullable=False)
+    max_attempts = Column(Integer, nullable=False)
+    error = Column(String)
+
+    client_id = Column(Integer, ForeignKey(Client.id, ondelete="SET NULL"), index=True)
+    lease_expires_at = Column(DateTime)
+    created_at = Column(DateTime, default=func.now())
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        # Runners pick the most urgent, and then the largest, pending job that fits them.
+        Index("ix_jobs_status_priority_threads_id", status, priority, threads, id),
+        Index("ix_jobs_status_lease_expires_at", status, lease_expires_at),
+    )
+
+
+class DataVersion(Base):
+    """
+    A single row, whose version is incremented by every transaction that changes results or runners.
+    """
+
+    __tablename__ = "data_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+    result_deletions = Column(Integer, nullable=False, default=0, server_default="0")
+    "Incremented by every transaction that deletes results, for copies of the results to notice."
@@ -0,0 +1,62 @@
+import csv
+import enum
+import io
+import json
+from typing import AsyncIterator, List, Any, Dict
+
+from db import SessionLocal
+from dbmodels import Result
+from filters import ResultFilter
+from serialization import RESULT_FIELDS, result_query, result_dicts, dumps
+
+EXPORT_FIELDS = RESULT_FIELDS + ["tags"]
+
+# Number of rows fetched from the database cursor, and written to the client, at a time.
+CHUNK_SIZE = 1000
+
+
+class ExportFormat(str, enum.Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+
+
+async def _rows(filters: ResultFilter) -> AsyncIterator[List[Dict[str, Any]]]:
+    # The response is streamed after the request handler has returned, so the
+    # export cannot borrow the request's session and opens one of its own.
+    async with SessionLocal() as db:
+        rows = await db.stream(filters.apply(result_query()).order_by(Result.id))
+        async for chunk in rows.partitions(CHUNK_SIZE):
+            yield await result_dicts(db, chunk)
+
+
+async def _ndjson(filters: ResultFilter) -> AsyncIterator[bytes]:
+    async for chunk in _rows(filters):
+        yield b"".join(dumps(row) + b"\n" for row in chunk)
+
+
+async def _csv(filters: ResultFilter) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+
+    async for chunk in _rows(filters):
+        for row in chunk:
+            writer.writerow([*(row[field] for field in RESULT_FIELDS), json.dumps(row["tags"])])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def stream_results(filters: ResultFilter, format: ExportFormat) -> AsyncIterator[bytes]:
+    if format == ExportFormat.csv:
+        return _csv(filters)
+    return _ndjson(filters)
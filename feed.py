@@ -0,0 +1,155 @@
+import asyncio
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Any, Iterator, List, Optional, Set
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from db import SessionLocal
+from dbmodels import Result
+from filters import ResultFilter
+from serialization import result_query, result_dicts, dumps
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPE = "text/event-stream"
+
+# Number of missed results sent at a time when a subscriber resumes.
+CHUNK_SIZE = 1000
+
+
+class Subscription:
+    """
+    The results waiting to be sent to a single subscriber. When the subscriber falls behind by more than
+    `size` results, the oldest ones are dropped, so that a slow reader cannot hold up publishers or grow
+    without bound.
+    """
+
+    def __init__(self, filters: ResultFilter, size: int):
+        self.filters = filters
+        self.results: Deque[Dict[str, Any]] = deque(maxlen=size)
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def put(self, result: Dict[str, Any]):
+        if len(self.results) == self.results.maxlen:
+            self.dropped += 1
+        self.results.append(result)
+        self._ready.set()
+
+    async def get(self, timeout: float) -> List[Dict[str, Any]]:
+        """
+        All buffered results, waiting up to `timeout` seconds for one. Returns an empty list on timeout.
+        """
+
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+        results = list(self.results)
+        self.results.clear()
+        return results
+
+
+class FeedHub:
+    """
+    Broadcasts stored results to the live feed subscribers of this process.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._subscriptions: Set[Subscription] = set()
+        self._dropped = 0
+
+    @contextmanager
+    def subscribe(self, filters: ResultFilter) -> Iterator[Subscription]:
+        subscription = Subscription(filters, self.size)
+        self._subscriptions.add(subscription)
+        try:
+            yield subscription
+        finally:
+            self._subscriptions.discard(subscription)
+            self._dropped += subscription.dropped
+
+    def publish(self, results: List[Dict[str, Any]]):
+        for subscription in self._subscriptions:
+            for result in results:
+                if subscription.filters.matches(result):
+                    subscription.put(result)
+
+    async def publish_stored(self, db: AsyncSession, mappings: List[Dict[str, Any]]):
+        """
+        Publish committed results, given as the mappings `insert_results` returned. They are read back, so that
+        subscribers get them exactly as `GET /results` lists them, but only when anyone is subscribed. Never
+        raises, as the results are committed already.
+        """
+
+        if not self._subscriptions or not mappings:
+            return
+        ids = [mapping["id"] for mapping in mappings]
+        try:
+            rows = (await db.execute(result_query().where(Result.id.in_(ids)).order_by(Result.id))).all()
+            self.publish(await result_dicts(db, rows))
+        except Exception:
+            # The results are stored by now, failing would only make runners submit them again.
+            logger.exception("Failed to publish %d results to the live feed", len(ids))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subscriptions),
+            "dropped": self._dropped + sum(subscription.dropped for subscription in self._subscriptions),
+        }
+
+
+def _event(result: Dict[str, Any]) -> bytes:
+    return b"id: %d\nevent: result\ndata: %s\n\n" % (result["id"], dumps(result))
+
+
+async def stream_feed(
+        filters: ResultFilter,
+        after: Optional[int],
+        is_disconnected: Callable[[], Awaitable[bool]]) -> AsyncIterator[bytes]:
+    """
+    Server-sent events for the results stored from now on that pass the filters, preceded by those after the
+    result id `after`, when resuming. Results dropped because the subscriber fell behind are reported with a
+    `dropped` event, after which the subscriber can resume from the last id it received to fetch them.
+    """
+
+    with feed_hub.subscribe(filters) as subscription:
+        # Subscribing first means results stored while catching up are buffered, rather than missed, so the
+        # ones already sent while catching up are skipped when the buffer is first read.
+        replayed: Set[int] = set()
+        if after is not None:
+            # Catching up happens while the response streams, long after the request's session is closed.
+            async with SessionLocal() as db:
+                while True:
+                    rows = (await db.execute(
+                        filters.apply(result_query()).where(Result.id > after).order_by(Result.id).limit(CHUNK_SIZE)
+                    )).all()
+                    if not rows:
+                        break
+                    results = await result_dicts(db, rows)
+                    yield b"".join(_event(result) for result in results)
+                    replayed.update(result["id"] for result in results)
+                    after = rows[-1].id
+
+        reported = 0
+        while True:
+            results = await subscription.get(settings.feed_keepalive_seconds)
+            if subscription.dropped > reported:
+                yield b"event: dropped\ndata: %s\n\n" % dumps({"count": subscription.dropped - reported})
+                reported = subscription.dropped
+
+            if results:
+                yield b"".join(_event(result) for result in results if result["id"] not in replayed)
+                replayed.clear()
+            elif await is_disconnected():
+                return
+            else:
+                yield b": keepalive\n\n"
+
+
+feed_hub = FeedHub(settings.feed_buffer_size)
@@ -0,0 +1,102 @@
+from datetime import datetime, timezone
+from typing import Optional, List, Tuple, Dict, Any
+
+from fastapi import Query, HTTPException
+from sqlalchemy import select
+from sqlalchemy.sql import Select
+from starlette.status import HTTP_400_BAD_REQUEST
+
+from dbmodels import Result, ResultTag
+
+
+def parse_tags(tags: Optional[List[str]]) -> List[Tuple[str, str]]:
+    parsed = []
+    for tag in tags or []:
+        key, separator, value = tag.partition("=")
+        if not separator:
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail=f"Tag filter {tag!r} is not of the form key=value"
+            )
+        parsed.append((key, value))
+    return parsed
+
+
+def _naive_utc(value: datetime) -> datetime:
+    # Submission times are stored in UTC, without a time zone.
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class ResultFilter:
+    """
+    Query parameters shared by all endpoints that select results.
+    """
+
+    def __init__(
+            self,
+            implementation: Optional[str] = Query(None),
+            solution: Optional[str] = Query(None),
+            label: Optional[str] = Query(None),
+            threads: Optional[int] = Query(None),
+            client_id: Optional[int] = Query(None, title="Runner ID"),
+            run_id: Optional[str] = Query(None),
+            submitted_after: Optional[datetime] = Query(None, title="Only results submitted at or after this time"),
+            submitted_before: Optional[datetime] = Query(None, title="Only results submitted before this time"),
+            tag: Optional[List[str]] = Query(None, title="Only results with all of these tags, as key=value")):
+        self.implementation = implementation
+        self.solution = solution
+        self.label = label
+        self.threads = threads
+        self.client_id = client_id
+        self.run_id = run_id
+        self.submitted_after = submitted_after
+        self.submitted_before = submitted_before
+        self.tags = parse_tags(tag)
+
+    def apply(self, query: Select) -> Select:
+        if self.implementation is not None:
+            query = query.where(Result.implementation == self.implementation)
+        if self.solution is not None:
+            query = query.where(Result.solution == self.solution)
+        if self.label is not None:
+            query = query.where(Result.label == self.label)
+        if self.threads is not None:
+            query = query.where(Result.threads == self.threads)
+        if self.client_id is not None:
+            query = query.where(Result.client_id == self.client_id)
+        if self.run_id is not None:
+            query = query.where(Result.run_id == self.run_id)
+        if self.submitted_after is not None:
+            query = query.where(Result.submitted_at >= self.submitted_after)
+        if self.submitted_before is not None:
+            query = query.where(Result.submitted_at < self.submitted_before)
+        for key, value in self.tags:
+            query = query.where(Result.id.in_(
+                select(ResultTag.result_id).where(ResultTag.key == key, ResultTag.value == value)
+            ))
+        return query
+
+    def matches(self, result: Dict[str, Any]) -> bool:
+        """
+        Whether a result, shaped like `models.Result`, passes the filter, as `apply` would select it.
+        """
+
+        for key, value in (
+                ("implementation", self.implementation),
+                ("solution", self.solution),
+                ("label", self.label),
+                ("threads", self.threads),
+                ("client_id", self.client_id),
+                ("run_id", self.run_id)):
+            if value is not None and result[key] != value:
+                return False
+        submitted_at = result["submitted_at"]
+        if self.submitted_after is not None and (
+                submitted_at is None or submitted_at < _naive_utc(self.submitted_after)):
+            return False
+        if self.submitted_before is not None and (
+                submitted_at is None or submitted_at >= _naive_utc(self.submitted_before)):
+            return False
+        return all(result["tags"].get(key) == value for key, value in self.tags)
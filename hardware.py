@@ -0,0 +1,122 @@
+import hashlib
+from typing import Dict, Any, Type
+
+import orjson
+from sqlalchemy import select, update, delete, insert, exists, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from db import Base, conflict_insert
+from dbmodels import Client, DockerInfo, SystemInfo, RaspberryInfo, OsInfo, CpuInfo, CacheInfo, DataVersion
+
+# Key of the PostgreSQL advisory lock that `lock_profiles` takes.
+PROFILES_LOCK = 0x68617264
+
+
+def content_hash(values: Dict[str, Any]) -> str:
+    return hashlib.sha256(orjson.dumps(values, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def meta_hash(props: models.ClientMeta) -> str:
+    return content_hash(props.dict())
+
+
+async def lock_profiles(db: AsyncSession):
+    """
+    Serialize transactions that change which hardware and operating system rows runners refer to, until the
+    transaction ends. Otherwise a row could be pruned between one runner looking it up and pointing at it.
+    """
+
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        await db.execute(select(func.pg_advisory_xact_lock(PROFILES_LOCK)))
+    elif dialect == "sqlite":
+        # Writing takes the database-wide write lock, and everything read afterwards is current, as of it.
+        await db.execute(update(DataVersion).where(DataVersion.id == 1).values(version=DataVersion.version))
+
+
+async def _profile_id(db: AsyncSession, model: Type[Base], values: Dict[str, Any], content: Dict[str, Any]) -> int:
+    """
+    The id of the row of `model` with the given content, which is inserted if no runner reported it before.
+    `content` is what is hashed, which includes the content of referenced rows, rather than their ids.
+    """
+
+    digest = content_hash(content)
+    query = select(model.id).where(model.hash == digest)
+
+    id = (await db.execute(query)).scalar_one_or_none()
+    if id is not None:
+        return id
+
+    # Another runner with the same hardware may be inserting the same row concurrently.
+    statement = conflict_insert(db.bind.dialect.name, model)
+    if statement is not None:
+        statement = statement.on_conflict_do_nothing(index_elements=[model.hash])
+    else:
+        statement = insert(model)
+    await db.execute(statement.values(hash=digest, **values))
+
+    return (await db.execute(query)).scalar_one()
+
+
+async def prune_profiles(db: AsyncSession):
+    """
+    Remove hardware and operating system rows that no runner refers to anymore. The caller must have taken
+    `lock_profiles` before changing which rows runners refer to.
+    """
+
+    for model, column in (
+            (SystemInfo, Client.system_id),
+            (OsInfo, Client.os_id),
+            (CpuInfo, Client.cpu_id),
+            (DockerInfo, Client.docker_id),
+            (RaspberryInfo, SystemInfo.raspberry_id),
+            (CacheInfo, CpuInfo.cache_id)):
+        await db.execute(
+            delete(model).where(~exists().where(column == model.id)).execution_options(synchronize_session=False)
+        )
+
+
+async def store_system_info(db: AsyncSession, client_id: int, props: models.ClientMeta) -> bool:
+    """
+    Store the system properties a runner reports, unless they are identical to what it reported before.
+    Returns whether anything changed. The caller is responsible for committing.
+
+    Runners report their properties every time they start, and those hardly ever change. So the common case
+    costs a single SELECT. Otherwise the runner is pointed at the rows with the reported contents, which are
+    only inserted if no other runner has the same hardware.
+    """
+
+    digest = meta_hash(props)
+    current = (await db.execute(select(Client.meta_hash).where(Client.id == client_id))).scalar_one()
+    if current == digest:
+        return False
+
+    await lock_profiles(db)
+    raspberry_id = None
+    if props.system.raspberry is not None:
+        raspberry = props.system.raspberry.dict()
+        raspberry_id = await _profile_id(db, RaspberryInfo, raspberry, raspberry)
+    system_id = await _profile_id(db, SystemInfo, {
+        **props.system.dict(exclude={"raspberry"}),
+        "raspberry_id": raspberry_id,
+    }, props.system.dict())
+
+    cache = props.cpu.cache.dict()
+    cache_id = await _profile_id(db, CacheInfo, cache, cache)
+    cpu_id = await _profile_id(db, CpuInfo, {
+        **props.cpu.dict(exclude={"cache"}),
+        "cache_id": cache_id,
+    }, props.cpu.dict())
+
+    os = props.os.dict()
+    os_id = await _profile_id(db, OsInfo, os, os)
+    docker = props.docker.dict()
+    docker_id = await _profile_id(db, DockerInfo, docker, docker)
+
+    await db.execute(update(Client).where(Client.id == client_id).values(
+        meta_hash=digest, system_id=system_id, os_id=os_id, cpu_id=cpu_id, docker_id=docker_id,
+    ))
+    await prune_profiles(db)
+
+    return True
@@ -1,11 +1,19 @@
 import abc
+import asyncio
 import re
+import time
 import typing
 from abc import ABC
-from typing import Optional, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Callable, TypeVar
 
 import bcrypt
 
+import metrics
+from config import settings
+
+T = TypeVar("T")
+
 
 class Hasher(ABC):
     @abc.abstractmethod
@@ -58,10 +66,18 @@ class BcryptHasher(Hasher):
         return match.group('cost') == str(self.cost) and match.group('version') == "2b"
 
     def hash(self, password: str) -> str:
-        return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+        start = time.perf_counter()
+        try:
+            return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+        finally:
+            metrics.password_hash_duration.observe(time.perf_counter() - start, "hash")
 
     def verify(self, hash: str, password: str) -> bool:
-        return bcrypt.checkpw(password.encode("utf-8"), hash.encode("utf-8"))
+        start = time.perf_counter()
+        try:
+            return bcrypt.checkpw(password.encode("utf-8"), hash.encode("utf-8"))
+        finally:
+            metrics.password_hash_duration.observe(time.perf_counter() - start, "verify")
 
 
 preferred_hasher: Hasher = BcryptHasher()
@@ -108,3 +124,11 @@ def verify_password(hash: str, password: str) -> typing.Union[bool, str]:
         return preferred_hasher.hash(password)
 
     return True
+
+
+# bcrypt releases the GIL, so a small pool of threads is enough to keep the hashing off the request threads.
+hasher_pool = ThreadPoolExecutor(max_workers=settings.hasher_workers, thread_name_prefix="hasher")
+
+
+async def run_in_hasher_pool(func: Callable[..., T], *args) -> T:
+    return await asyncio.get_running_loop().run_in_executor(hasher_pool, func, *args)
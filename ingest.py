@@ -0,0 +1,197 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import List, Tuple, Any, Dict, Optional
+
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+from sqlalchemy import select, insert, func
+from sqlalchemy.orm import Session
+from starlette.status import HTTP_400_BAD_REQUEST, HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+import leaderboard
+import models
+import runner_stats
+from dbmodels import Result, ResultTag
+from versioning import bump_version
+
+MAX_BATCH_SIZE = 10000
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/jsonlines", "application/x-jsonlines")
+
+
+class _MalformedLine:
+    """
+    A line of a newline-delimited batch that isn't JSON, which is rejected like a result that isn't valid.
+    """
+
+    def __init__(self, error: ValueError):
+        self.errors = [{"loc": [], "msg": f"Malformed JSON: {error}", "type": "value_error.jsondecode"}]
+
+
+def _parse_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return _MalformedLine(e)
+
+
+def _parse_body(body: bytes, content_type: str) -> List[Any]:
+    if content_type.split(";")[0].strip() in NDJSON_MEDIA_TYPES:
+        return [_parse_line(line) for line in body.splitlines() if line.strip()]
+
+    try:
+        rows = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail=f"Malformed batch: {e}")
+
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="A batch must be a JSON array of results")
+
+    return rows
+
+
+async def result_batch(request: Request) -> List[Any]:
+    """
+    Read a batch of results, either as a JSON array, or as newline-delimited JSON.
+
+    Only the framing of the batch is checked here, each row is validated separately by `validate_batch`. Lines
+    of newline-delimited JSON are parsed separately too, so that a malformed one only gets that line rejected.
+    """
+
+    rows = _parse_body(await request.body(), request.headers.get("content-type", ""))
+
+    if len(rows) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"A batch may contain at most {MAX_BATCH_SIZE} results"
+        )
+
+    return rows
+
+
+def validate_batch(rows: List[Any]) -> Tuple[List[models.Result], models.BatchStatus]:
+    valid: List[models.Result] = []
+    items: List[models.BatchItemStatus] = []
+
+    for index, row in enumerate(rows):
+        if isinstance(row, _MalformedLine):
+            items.append(models.BatchItemStatus(index=index, accepted=False, errors=row.errors))
+            continue
+        try:
+            valid.append(models.Result.parse_obj(row))
+            items.append(models.BatchItemStatus(index=index, accepted=True))
+        except ValidationError as e:
+            items.append(models.BatchItemStatus(index=index, accepted=False, errors=e.errors()))
+
+    status = models.BatchStatus(accepted=len(valid), rejected=len(items) - len(valid), items=items)
+    return valid, status
+
+
+def idempotency_key(result: models.Result) -> Optional[str]:
+    """
+    The key under which a runner stores a result at most once: the one it was submitted with, or else a hash of
+    what identifies the result within its run. Results without either are always stored.
+
+    Results of a batch submitted without a run id get a generated one, which must not be hashed, as a retry
+    of the batch would get another.
+    """
+
+    if result.idempotency_key is not None:
+        return result.idempotency_key
+    if result.run_id is None:
+        return None
+    identity = [result.implementation, result.solution, result.label, result.threads, result.run_id]
+    return hashlib.sha256(json.dumps(identity).encode("utf-8")).hexdigest()
+
+
+def stored_results(db: Session, client_id: int, keys: List[str]) -> Dict[str, int]:
+    """
+    The ids of the results a runner stored under any of the idempotency keys, by key.
+    """
+
+    if not keys:
+        return {}
+    return dict(db.execute(select(Result.idempotency_key, Result.id).where(
+        Result.client_id == client_id, Result.idempotency_key.in_(keys)
+    )).all())
+
+
+def _insert_rows(db: Session, mappings: List[Dict[str, Any]]):
+    """
+    Insert result rows with a single executemany, and add their generated ids to the mappings, which are needed
+    to insert the tags.
+    """
+
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        # The ids are drawn up front, since the order of the rows a multi-row INSERT returns is not guaranteed.
+        ids = db.execute(
+            select(func.nextval(func.pg_get_serial_sequence(Result.__tablename__, "id")))
+            .select_from(func.generate_series(1, len(mappings)))
+        ).scalars().all()
+        for mapping, id in zip(mappings, ids):
+            mapping["id"] = id
+        db.execute(insert(Result), mappings)
+    elif dialect == "sqlite":
+        db.execute(insert(Result), mappings)
+        # Writers are serialized, so the rows got consecutive ids, up to the largest one.
+        last = db.execute(select(func.max(Result.id))).scalar_one()
+        for id, mapping in enumerate(mappings, start=last - len(mappings) + 1):
+            mapping["id"] = id
+    else:
+        # Fetching the generated ids takes an INSERT per row.
+        db.bulk_insert_mappings(Result, mappings, return_defaults=True)
+
+
+def insert_results(
+        db: Session,
+        client_id: int,
+        results: List[models.Result],
+        submitted_at: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Insert results for a client, and their tags, in bulk, and account them in the leaderboard.
+    The caller is responsible for committing. Returns the inserted rows, including their ids.
+
+    `submitted_at` defaults to the time of insertion. Results with the idempotency key of a result the client
+    stored before, or of an earlier one in `results`, are skipped, and left out of the returned rows.
+    """
+
+    seen = set(stored_results(db, client_id, [
+        result.idempotency_key for result in results if result.idempotency_key is not None
+    ]))
+    unique = []
+    for result in results:
+        if result.idempotency_key is not None:
+            if result.idempotency_key in seen:
+                continue
+            seen.add(result.idempotency_key)
+        unique.append(result)
+    if not unique:
+        return []
+    results = unique
+
+    cpu_brand, architecture = leaderboard.runner_hardware(db, client_id)
+    mappings = [
+        {
+            **result.dict(exclude={"id", "submitted_at", "tags"}),
+            "client_id": client_id,
+            "cpu_brand": cpu_brand,
+            "architecture": architecture,
+        }
+        for result in results
+    ]
+    if submitted_at is not None:
+        for mapping in mappings:
+            mapping["submitted_at"] = submitted_at
+    _insert_rows(db, mappings)
+    db.bulk_insert_mappings(ResultTag, [
+        {"result_id": mapping["id"], "key": key, "value": value}
+        for mapping, result in zip(mappings, results)
+        for key, value in result.tags.items()
+    ])
+    leaderboard.record_results(db, mappings)
+    runner_stats.record_results(db, client_id, mappings)
+    db.execute(bump_version)
+
+    return mappings
@@ -0,0 +1,265 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+import orjson
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from starlette.status import HTTP_429_TOO_MANY_REQUESTS
+
+import models
+from config import settings
+from db import SessionLocal
+from feed import feed_hub
+from ingest import insert_results
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueue:
+    """
+    A write-behind queue for results. Submissions are appended to a local journal, and acknowledged once the
+    journal is synced to disk. A background task stores them in the database in batches, after which they are
+    marked as done in the journal. Submissions that were not stored when the service stopped are replayed
+    from the journal when it starts again.
+
+    Submissions are stored at least once: if the service crashes between storing a batch and marking it as
+    done, the batch is stored again when the journal is replayed. Submissions the database rejects, e.g.
+    because their runner was removed, are moved to a dead letter file next to the journal, rather than retried.
+
+    The journal belongs to a single process, so every worker needs its own.
+    """
+
+    def __init__(self, path: str, maxsize: int, batch_size: int):
+        self.path = path
+        self.dead_letter_path = path + ".dead"
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+
+        self.accepted = 0
+        self.rejected = 0
+        self.stored = 0
+        self.failed = 0
+        self.dead_lettered = 0
+        self.batches = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self._flush_seconds = 0.0
+
+        # Submissions that were accepted, but not stored yet, including those that are being journaled.
+        self._pending = 0
+        # Submissions that could not be stored, which stay in the journal to be retried after a restart.
+        self._failed: Dict[str, Dict[str, Any]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._journal = None
+        self._journal_lock = threading.Lock()
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        entries = await asyncio.to_thread(self._replay)
+        for entry in entries:
+            self._queue.put_nowait(entry)
+        self._pending = len(entries)
+        if entries:
+            logger.info("Replaying %d submissions from %s", len(entries), self.path)
+
+        self._task = asyncio.create_task(self._drain())
+
+    async def stop(self, timeout: float = 30.0):
+        """
+        Store what is queued, for at most `timeout` seconds. Whatever is left is replayed on the next start.
+        """
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Leaving %d submissions in %s", self._queue.qsize(), self.path)
+
+        self._task.cancel()
+        self._journal.close()
+
+    async def submit(self, client_id: int, results: List[models.Result]) -> str:
+        """
+        Queue results, and return the ingest id they were accepted under.
+        Raises a 429 when the queue is full, so that runners back off.
+        """
+
+        if self._pending >= self.maxsize:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many results are waiting to be stored, try again later",
+                headers={"Retry-After": "1"},
+            )
+
+        entry = {
+            "id": uuid.uuid4().hex,
+            "client_id": client_id,
+            "submitted_at": datetime.utcnow().isoformat(),
+            "results": [result.dict(exclude={"id", "client_id", "submitted_at"}) for result in results],
+        }
+
+        self._pending += 1
+        try:
+            await asyncio.to_thread(self._append, [entry])
+        except BaseException:
+            self._pending -= 1
+            raise
+
+        self._queue.put_nowait(entry)
+        self.accepted += 1
+        return entry["id"]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "pending": self._pending,
+            "maxsize": self.maxsize,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "stored": self.stored,
+            "failed": self.failed,
+            "dead_lettered": self.dead_lettered,
+            "batches": self.batches,
+            "last_flush_seconds": self.last_flush_seconds,
+            "mean_flush_seconds": self._flush_seconds / self.batches if self.batches else 0.0,
+            "max_flush_seconds": self.max_flush_seconds,
+        }
+
+    def _replay(self) -> List[Dict[str, Any]]:
+        """
+        Read the submissions that were not stored from the journal, and compact it to just those.
+        """
+
+        entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as journal:
+                for line in journal:
+                    try:
+                        record = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        # Only the last line can be torn, by a crash while it was being written.
+                        logger.warning("Skipping a malformed line in %s", self.path)
+                        continue
+                    if "done" in record:
+                        for id in record["done"]:
+                            entries.pop(id, None)
+                    else:
+                        entries[record["id"]] = record
+
+        self._compact(list(entries.values()))
+        return list(entries.values())
+
+    def _compact(self, entries: List[Dict[str, Any]], if_idle: bool = False):
+        with self._journal_lock:
+            # A submission may have been accepted since compacting was decided on, and be journaled already.
+            if if_idle and self._pending:
+                return
+
+            if self._journal is not None:
+                self._journal.close()
+
+            temporary = self.path + ".tmp"
+            with open(temporary, "wb") as journal:
+                journal.writelines(orjson.dumps(entry) + b"\n" for entry in entries)
+                journal.flush()
+                os.fsync(journal.fileno())
+            os.replace(temporary, self.path)
+
+            self._journal = open(self.path, "ab")
+
+    def _append(self, records: List[Dict[str, Any]]):
+        with self._journal_lock:
+            self._journal.writelines(orjson.dumps(record) + b"\n" for record in records)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+    def _dead_letter(self, entries: List[Dict[str, Any]]):
+        with open(self.dead_letter_path, "ab") as dead_letters:
+            dead_letters.writelines(orjson.dumps(entry) + b"\n" for entry in entries)
+            dead_letters.flush()
+            os.fsync(dead_letters.fileno())
+
+    async def _drain(self):
+        while True:
+            entries = [await self._queue.get()]
+            while len(entries) < self.batch_size and not self._queue.empty():
+                entries.append(self._queue.get_nowait())
+
+            try:
+                await self._flush(entries)
+            except Exception:
+                logger.exception("Failed to flush the ingest queue")
+            finally:
+                for _ in entries:
+                    self._queue.task_done()
+
+    async def _flush(self, entries: List[Dict[str, Any]]):
+        start = time.perf_counter()
+
+        failed = []
+        dead = []
+        try:
+            await self._store(entries)
+        except Exception:
+            logger.exception("Failed to store a batch of %d submissions, storing them one by one", len(entries))
+            # So that a single submission that can't be stored does not hold back the others.
+            for entry in entries:
+                try:
+                    await self._store_alone(entry)
+                except IntegrityError:
+                    logger.exception("Submission %s can't be stored, moving it to %s", entry["id"],
+                                     self.dead_letter_path)
+                    dead.append(entry)
+                except Exception:
+                    logger.exception("Failed to store submission %s, keeping it in the journal", entry["id"])
+                    failed.append(entry)
+            if dead:
+                await asyncio.to_thread(self._dead_letter, dead)
+                self.dead_lettered += len(dead)
+
+        elapsed = time.perf_counter() - start
+        self.batches += 1
+        self.last_flush_seconds = elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        self._flush_seconds += elapsed
+        self.failed += len(failed)
+        self.stored += len(entries) - len(failed) - len(dead)
+
+        for entry in failed:
+            self._failed[entry["id"]] = entry
+        done = [entry["id"] for entry in entries if entry["id"] not in self._failed]
+        if done:
+            await asyncio.to_thread(self._append, [{"done": done}])
+
+        self._pending -= len(entries)
+        if self._pending == 0:
+            # Nothing is in flight, so the journal can be cut down to what could not be stored.
+            await asyncio.to_thread(self._compact, list(self._failed.values()), True)
+
+    async def _store_alone(self, entry: Dict[str, Any]):
+        try:
+            await self._store([entry])
+        except IntegrityError:
+            # A concurrent submission with the same idempotency key may have stored some of the results first,
+            # which are skipped when trying again. Otherwise the submission can never be stored.
+            await self._store([entry])
+
+    async def _store(self, entries: List[Dict[str, Any]]):
+        async with SessionLocal() as db:
+            stored = []
+            for entry in entries:
+                results = [models.Result.parse_obj(result) for result in entry["results"]]
+                submitted_at = datetime.fromisoformat(entry["submitted_at"])
+                stored += await db.run_sync(insert_results, entry["client_id"], results, submitted_at)
+            await db.commit()
+            await feed_hub.publish_stored(db, stored)
+
+
+ingest_queue = IngestQueue(settings.ingest_journal, settings.ingest_queue_size, settings.ingest_batch_size)
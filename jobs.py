@@ -0,0 +1,182 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import select, update, func, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.status import HTTP_403_FORBIDDEN
+
+import models
+from config import settings
+from dbmodels import Client, CpuInfo, DockerInfo, OsInfo, Job
+
+# Futures of the requests waiting for a job, resolved whenever jobs may have become available in this process.
+_waiters: Set[asyncio.Future] = set()
+
+
+def notify_waiters():
+    for waiter in _waiters:
+        if not waiter.done():
+            waiter.set_result(None)
+
+
+async def _wait_for_jobs(timeout: float):
+    waiter = asyncio.get_running_loop().create_future()
+    _waiters.add(waiter)
+    try:
+        await asyncio.wait_for(waiter, timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        _waiters.discard(waiter)
+
+
+async def create_jobs(db: AsyncSession, requests: List[models.JobRequest]) -> List[Job]:
+    """
+    Queue jobs. The caller is responsible for committing, and for notifying waiting runners afterwards.
+    """
+
+    # Stamped here rather than by the database, so that the jobs can be returned without reloading them.
+    created_at = datetime.utcnow()
+    jobs = [
+        Job(**request.dict(), run_id=uuid.uuid4().hex, status=models.JobStatus.pending.value, attempts=0,
+            created_at=created_at)
+        for request in requests
+    ]
+    db.add_all(jobs)
+    await db.flush()
+    return jobs
+
+
+async def expire_leases(db: AsyncSession):
+    """
+    Hand out jobs whose lease expired again, or fail them when they have no attempts left.
+    """
+
+    expired = and_(Job.status == models.JobStatus.leased.value, Job.lease_expires_at < datetime.utcnow())
+    await db.execute(update(Job).where(expired, Job.attempts >= Job.max_attempts).values(
+        status=models.JobStatus.failed.value, error="Lease expired", client_id=None, lease_expires_at=None,
+        finished_at=datetime.utcnow(),
+    ).execution_options(synchronize_session=False))
+    await db.execute(update(Job).where(expired).values(
+        status=models.JobStatus.pending.value, client_id=None, lease_expires_at=None,
+    ).execution_options(synchronize_session=False))
+
+
+async def release_jobs(db: AsyncSession, client_ids: List[int]):
+    """
+    Hand the jobs leased by runners that are going away to other runners, without using up an attempt.
+    """
+
+    await db.execute(update(Job).where(
+        Job.client_id.in_(client_ids), Job.status == models.JobStatus.leased.value
+    ).values(
+        status=models.JobStatus.pending.value, client_id=None, lease_expires_at=None, attempts=Job.attempts - 1,
+    ).execution_options(synchronize_session=False))
+
+
+async def _runner_capacity(db: AsyncSession, client_id: int) -> Tuple[int, Optional[str]]:
+    """
+    The number of CPUs of a runner, and its architecture, as it reported them. Inside Docker, the CPUs
+    available to the Docker daemon count, rather than those of the host.
+
+    Raises a 403 when the runner was removed, which a token cached before can outlive.
+    """
+
+    query = select(
+        func.coalesce(DockerInfo.ncpu, CpuInfo.cores, 1),
+        func.coalesce(DockerInfo.architecture, OsInfo.arch),
+    ).select_from(Client).outerjoin(Client.cpu).outerjoin(Client.docker).outerjoin(Client.os) \
+        .where(Client.id == client_id)
+    row = (await db.execute(query)).one_or_none()
+    if row is None:
+        raise HTTPException(status_code=HTTP_403_FORBIDDEN, detail="Invalid authentication credentials")
+    cpus, architecture = row
+    return cpus, architecture
+
+
+async def _claim(db: AsyncSession, client_id: int) -> Optional[Job]:
+    # Expiring leases writes first, which on SQLite takes the write lock, so that claims are serialized.
+    await expire_leases(db)
+
+    cpus, architecture = await _runner_capacity(db, client_id)
+    in_use = (await db.execute(
+        select(func.coalesce(func.sum(Job.threads), 0))
+        .where(Job.client_id == client_id, Job.status == models.JobStatus.leased.value)
+    )).scalar_one()
+
+    # The largest jobs go to the runners that can fit them first, which shortens the overall run.
+    candidates = select(Job.id).where(
+        Job.status == models.JobStatus.pending.value,
+        Job.threads <= cpus - in_use,
+        or_(Job.architecture.is_(None), Job.architecture == architecture),
+    ).order_by(Job.priority.desc(), Job.threads.desc(), Job.id).limit(1).with_for_update(skip_locked=True)
+
+    while True:
+        job_id = (await db.execute(candidates)).scalar_one_or_none()
+        if job_id is None:
+            return None
+
+        claimed = await db.execute(update(Job).where(
+            Job.id == job_id, Job.status == models.JobStatus.pending.value
+        ).values(
+            status=models.JobStatus.leased.value,
+            client_id=client_id,
+            attempts=Job.attempts + 1,
+            lease_expires_at=datetime.utcnow() + timedelta(seconds=settings.job_lease_seconds),
+        ).execution_options(synchronize_session=False))
+        if claimed.rowcount:
+            return (await db.execute(select(Job).where(Job.id == job_id))).scalar_one()
+
+
+async def next_job(db: AsyncSession, client_id: int, wait: float) -> Optional[Job]:
+    """
+    Lease the next job that fits a runner, waiting up to `wait` seconds for one to become available.
+    """
+
+    deadline = time.monotonic() + wait
+    while True:
+        job = await _claim(db, client_id)
+        await db.commit()
+        if job is not None:
+            return job
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        # Leases expiring in other processes aren't notified, so check again once in a while.
+        await _wait_for_jobs(min(remaining, settings.job_poll_seconds))
+
+
+async def leased_job(db: AsyncSession, client_id: int, job_id: int) -> Optional[Job]:
+    """
+    The job, if the runner still holds its lease.
+    """
+
+    job = (await db.execute(select(Job).where(Job.id == job_id).with_for_update())).scalar_one_or_none()
+    if job is None or job.client_id != client_id or job.status != models.JobStatus.leased.value \
+            or job.lease_expires_at < datetime.utcnow():
+        return None
+    return job
+
+
+def extend_lease(job: Job):
+    job.lease_expires_at = datetime.utcnow() + timedelta(seconds=settings.job_lease_seconds)
+
+
+def finish_job(job: Job, outcome: models.JobOutcome):
+    job.lease_expires_at = None
+    job.error = outcome.error
+
+    if outcome.success:
+        job.status = models.JobStatus.done.value
+        job.finished_at = datetime.utcnow()
+    elif job.attempts < job.max_attempts:
+        job.status = models.JobStatus.pending.value
+        job.client_id = None
+    else:
+        job.status = models.JobStatus.failed.value
+        job.finished_at = datetime.utcnow()
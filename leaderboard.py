@@ -0,0 +1,206 @@
+import math
+from collections import defaultdict
+from typing import List, Dict, Any, Tuple, Iterable, Optional, Set
+
+from sqlalchemy import select, func, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+from dbmodels import Client, CpuInfo, DockerInfo, OsInfo, Result, LeaderboardEntry
+
+# Passes per second are counted in logarithmic buckets, this many per doubling, for an error of about 2%.
+BUCKETS_PER_OCTAVE = 16
+
+GroupKey = Tuple[str, str, str, int, str, str]
+GROUP_COLUMNS = (Result.implementation, Result.solution, Result.label, Result.threads,
+                 Result.cpu_brand, Result.architecture)
+# What accounting a result in the leaderboard takes.
+ACCOUNTED_COLUMNS = (Result.id, *GROUP_COLUMNS, Result.passes, Result.duration)
+
+
+def passes_per_second(passes: int, duration: float) -> Optional[float]:
+    if not duration or duration <= 0 or passes is None or passes <= 0:
+        return None
+    return passes / duration
+
+
+def bucket(value: float) -> int:
+    return math.floor(math.log2(value) * BUCKETS_PER_OCTAVE)
+
+
+def percentile(histogram: Dict[str, int], count: int, fraction: float) -> Optional[float]:
+    """
+    Estimate a percentile from a histogram, as the geometric middle of the bucket it falls into.
+    """
+
+    if not count:
+        return None
+
+    rank = fraction * count
+    seen = 0
+    for index in sorted(int(key) for key in histogram):
+        seen += histogram[str(index)]
+        if seen >= rank:
+            return 2 ** ((index + 0.5) / BUCKETS_PER_OCTAVE)
+    return None
+
+
+def to_model(entry: LeaderboardEntry) -> models.LeaderboardEntry:
+    count = entry.result_count
+    return models.LeaderboardEntry(
+        implementation=entry.implementation,
+        solution=entry.solution,
+        label=entry.label,
+        threads=entry.threads,
+        cpu_brand=entry.cpu_brand,
+        architecture=entry.architecture,
+        result_count=count,
+        best_passes_per_second=entry.best_passes_per_second,
+        best_result_id=entry.best_result_id,
+        mean_passes_per_second=entry.mean_passes_per_second,
+        stddev_passes_per_second=math.sqrt(entry.m2_passes_per_second / (count - 1)) if count > 1 else 0.0,
+        median_passes_per_second=percentile(entry.histogram, count, 0.5),
+        p90_passes_per_second=percentile(entry.histogram, count, 0.9),
+        p99_passes_per_second=percentile(entry.histogram, count, 0.99),
+    )
+
+
+def runner_hardware(db: Session, client_id: int) -> Tuple[str, str]:
+    """
+    The CPU brand and architecture a runner's results are grouped by, which are stored with each result when it
+    is inserted, so that the runner changing its hardware later doesn't move its earlier results.
+    """
+
+    query = select(CpuInfo.brand, func.coalesce(DockerInfo.architecture, OsInfo.arch)) \
+        .select_from(Client).outerjoin(Client.cpu).outerjoin(Client.docker).outerjoin(Client.os) \
+        .where(Client.id == client_id)
+    brand, architecture = db.execute(query).one_or_none() or (None, None)
+    return brand or "", architecture or ""
+
+
+def _entry_criteria(key: GroupKey) -> Tuple[Any, ...]:
+    implementation, solution, label, threads, cpu_brand, architecture = key
+    return (
+        LeaderboardEntry.implementation == implementation,
+        LeaderboardEntry.solution == solution,
+        LeaderboardEntry.label == label,
+        LeaderboardEntry.threads == threads,
+        LeaderboardEntry.cpu_brand == cpu_brand,
+        LeaderboardEntry.architecture == architecture,
+    )
+
+
+def _entry(db: Session, key: GroupKey) -> LeaderboardEntry:
+    implementation, solution, label, threads, cpu_brand, architecture = key
+    criteria = _entry_criteria(key)
+
+    entry = db.execute(select(LeaderboardEntry).where(*criteria).with_for_update()).scalar_one_or_none()
+    if entry is not None:
+        return entry
+
+    try:
+        # Another transaction may create the same group concurrently, which the unique constraint catches.
+        with db.begin_nested():
+            entry = LeaderboardEntry(
+                implementation=implementation, solution=solution, label=label, threads=threads,
+                cpu_brand=cpu_brand, architecture=architecture,
+                result_count=0, mean_passes_per_second=0.0, m2_passes_per_second=0.0, histogram={},
+            )
+            db.add(entry)
+        return entry
+    except IntegrityError:
+        return db.execute(select(LeaderboardEntry).where(*criteria).with_for_update()).scalar_one()
+
+
+def _merge(entry: LeaderboardEntry, samples: List[Tuple[int, float]]):
+    """
+    Merge a batch of (result id, passes per second) samples into an entry, combining means and sums of
+    squared deviations with Chan et al.'s parallel variant of Welford's algorithm.
+    """
+
+    values = [value for _, value in samples]
+    count = len(values)
+    mean = sum(values) / count
+    m2 = sum((value - mean) ** 2 for value in values)
+
+    total = entry.result_count + count
+    delta = mean - entry.mean_passes_per_second
+    entry.m2_passes_per_second += m2 + delta ** 2 * entry.result_count * count / total
+    entry.mean_passes_per_second += delta * count / total
+    entry.result_count = total
+
+    best_id, best = max(samples, key=lambda sample: sample[1])
+    if entry.best_passes_per_second is None or best > entry.best_passes_per_second:
+        entry.best_passes_per_second = best
+        entry.best_result_id = best_id
+
+    # Assign a new dictionary, so that the change is detected.
+    histogram = dict(entry.histogram or {})
+    for value in values:
+        histogram[str(bucket(value))] = histogram.get(str(bucket(value)), 0) + 1
+    entry.histogram = histogram
+
+
+def record_results(db: Session, results: List[Dict[str, Any]]):
+    """
+    Account inserted results, given as mappings that include their id and hardware, in the leaderboard.
+    This is meant to run in the transaction that inserts the results.
+    """
+
+    groups: Dict[GroupKey, List[Tuple[int, float]]] = defaultdict(list)
+    for result in results:
+        value = passes_per_second(result["passes"], result["duration"])
+        if value is None:
+            continue
+        key = (result["implementation"], result["solution"], result["label"], result["threads"],
+               result["cpu_brand"], result["architecture"])
+        groups[key].append((result["id"], value))
+
+    # Lock groups in a fixed order, so that concurrent batches can't deadlock.
+    for key in sorted(groups):
+        _merge(_entry(db, key), groups[key])
+
+
+def groups(db: Session, *criteria) -> Set[GroupKey]:
+    """
+    The groups the results matching the criteria are accounted in, which is needed to `refresh` them once the
+    results are removed.
+    """
+
+    return {tuple(row) for row in db.execute(select(*GROUP_COLUMNS).where(*criteria).distinct())}
+
+
+def refresh(db: Session, keys: Iterable[GroupKey]):
+    """
+    Recompute groups of the leaderboard from their results, e.g. after some of them have been removed.
+    Groups without results left are removed.
+    """
+
+    for key in sorted(keys):
+        db.execute(delete(LeaderboardEntry).where(*_entry_criteria(key)).execution_options(synchronize_session=False))
+
+        rows = db.execute(select(*ACCOUNTED_COLUMNS).where(
+            *(column == value for column, value in zip(GROUP_COLUMNS, key))
+        )).all()
+        if rows:
+            record_results(db, [dict(row._mapping) for row in rows])
+
+
+def rebuild(db: Session, chunk_size: int = 10000):
+    """
+    Recompute the leaderboard from all results, e.g. after results have been removed.
+    """
+
+    db.execute(delete(LeaderboardEntry))
+
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(*ACCOUNTED_COLUMNS).where(Result.id > last_id).order_by(Result.id).limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        record_results(db, [dict(row._mapping) for row in rows])
+        db.flush()
+        last_id = rows[-1].id
@@ -1,13 +1,38 @@
 import secrets
-from typing import List, Generator
-
-from fastapi import FastAPI, Depends
-from sqlalchemy.orm import Session
-
+import uuid
+from datetime import datetime
+from typing import List, Optional, Any, Dict, Union
+
+from fastapi import FastAPI, Depends, Query, Header, Request, Response, HTTPException
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from sqlalchemy import select, delete, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, noload
+from starlette.status import HTTP_400_BAD_REQUEST, HTTP_202_ACCEPTED, HTTP_204_NO_CONTENT, HTTP_404_NOT_FOUND, HTTP_409_CONFLICT
+
+import analysis
+import ingest
+import jobs
+import leaderboard
+import metrics
 import models
-from auth import admin_auth, client_auth
+import runner_stats
+from analysis import ResultSelector, result_selector, passes_per_second
+from archive import archive_results
+from auth import admin_auth, client_auth, admin_cache, client_cache, invalidate_client_token, ClientIdentity
+from config import settings
 from db import database
-from dbmodels import Admin, Client, Result, DockerInfo, RaspberryInfo, SystemInfo, OsInfo, CacheInfo, CpuInfo
+from export import ExportFormat, MEDIA_TYPES, stream_results
+from feed import MEDIA_TYPE as FEED_MEDIA_TYPE, feed_hub, stream_feed
+from filters import ResultFilter
+from hardware import store_system_info, lock_profiles, prune_profiles
+from ingest import result_batch, validate_batch, insert_results
+from ingest_queue import ingest_queue
+from serialization import result_query, result_dicts
+from snapshot import snapshot_store, npz_chunks
+from versioning import bump_version, bump_deletions, conditional_response, response_cache
+from dbmodels import Admin, Client, Result, SystemInfo, CpuInfo, LeaderboardEntry, RunnerBest, Job
 
 app = FastAPI()
 
@@ -16,131 +41,631 @@ app.version = "0.1"
 app.description = """
 This service manages benchmark runners and aggregates their results.
 """
+app.middleware("http")(metrics.measure_request)
+
+
+async def _load_clients(db: AsyncSession, results: models.RunnerResults, *criteria) -> List[models.Client]:
+    """
+    Load runners with a fixed number of queries, however many runners and results there are.
+    """
+
+    query = select(Client).where(*criteria).order_by(Client.id).options(
+        joinedload(Client.owner),
+        joinedload(Client.cpu).joinedload(CpuInfo.cache),
+        joinedload(Client.os),
+        joinedload(Client.system).joinedload(SystemInfo.raspberry),
+        joinedload(Client.docker),
+        noload(Client.results),
+    )
+    clients: List[Client] = (await db.execute(query)).scalars().all()
+
+    if results == models.RunnerResults.full:
+        # Results vastly outnumber runners, so they are selected as plain rows rather than as ORM objects.
+        by_client = {client.id: [] for client in clients}
+        if clients:
+            rows = (await db.execute(
+                result_query().where(Result.client_id.in_(by_client.keys())).order_by(Result.id)
+            )).all()
+            for result in await result_dicts(db, rows):
+                by_client[result["client_id"]].append(result)
+
+        return [models.Client.from_orm(client).copy(update={"results": by_client[client.id]}) for client in clients]
+
+    bests = {client.id: {} for client in clients}
+    if results == models.RunnerResults.summary and clients:
+        best_query = select(RunnerBest.client_id, RunnerBest.implementation, RunnerBest.best_passes_per_second) \
+            .where(RunnerBest.client_id.in_(bests.keys()))
+        for client_id, implementation, best in await db.execute(best_query):
+            bests[client_id][implementation] = best
+
+    return [
+        models.Client.from_orm(client).copy(update={
+            "results": None,
+            "result_summary": models.ResultSummary(
+                count=client.result_count,
+                last_result_id=client.last_result_id,
+                last_submitted_at=client.last_submitted_at,
+                best_passes_per_second=bests[client.id],
+            ) if results == models.RunnerResults.summary else None,
+        })
+        for client in clients
+    ]
 
 
 @app.get("/runners", summary="List runners", tags=["Bookkeeping"], response_model=List[models.Client])
-def list_clients(
+async def list_clients(
+        request: Request,
+        results: models.RunnerResults = Query(models.RunnerResults.summary),
         _admin: Admin = Depends(admin_auth),
-        db: Session = Depends(database)) -> List[models.Client]:
+        db: AsyncSession = Depends(database)) -> Response:
+    """
+    List all runners, with a summary of their results, which is maintained as results are published.
+    Their results themselves are listed by `GET /runners/{runner_id}/results`, or included with `results=full`.
+    Supports conditional requests through `ETag` and `If-None-Match`.
+    """
 
-    clients: List[Client] = db.query(Client).all()
-    return [models.Client.from_orm(client) for client in clients]
+    async def render():
+        return await _load_clients(db, results), {}
+
+    return await conditional_response(request, db, render)
 
 
 @app.post("/runners", summary="Add a new runner", tags=["Bookkeeping"], response_model=models.Client)
-def register(
+async def register(
         admin: Admin = Depends(admin_auth),
-        db: Session = Depends(database)) -> models.Client:
+        db: AsyncSession = Depends(database)) -> models.Client:
     client = Client(owner=admin, token=secrets.token_hex(nbytes=64))
     db.add(client)
-    db.commit()
-    db.expire(client, ("id", ))
-    return models.Client.from_orm(client)
+    await db.execute(bump_version)
+    await db.commit()
+    return (await _load_clients(db, models.RunnerResults.summary, Client.id == client.id))[0]
+
+
+async def _remove_runners(db: AsyncSession, *criteria) -> List[str]:
+    """
+    Remove the runners matching the criteria with a fixed number of statements, however many runners and results
+    there are, and return their tokens. The caller is responsible for committing, and for invalidating the tokens
+    afterwards.
+
+    The database deletes the runners' results, their tags and the runners' bests along with them. The leaderboard
+    groups the results were accounted in are recomputed from the results left.
+    """
+
+    clients = (await db.execute(select(Client.id, Client.token).where(*criteria))).all()
+    if not clients:
+        return []
+
+    ids = [client.id for client in clients]
+    # The results are deleted along with the runners, so the groups they were accounted in, under the hardware
+    # they were submitted on, are looked up first.
+    groups = await db.run_sync(leaderboard.groups, Result.client_id.in_(ids))
+    await lock_profiles(db)
+    await jobs.release_jobs(db, ids)
+    await db.execute(delete(Client).where(Client.id.in_(ids)).execution_options(synchronize_session=False))
+    # Hardware profiles may be shared with other runners, so only those no runner refers to anymore are removed.
+    await prune_profiles(db)
+    await db.run_sync(leaderboard.refresh, groups)
+    await db.execute(bump_deletions)
+    return [client.token for client in clients]
 
 
 @app.delete("/runners/{runner_id}", summary="Remove a runner", tags=["Bookkeeping"])
-def unregister(
+async def unregister(
         runner_id: int,
         admin: Admin = Depends(admin_auth),
-        db: Session = Depends(database)):
-    db.autocommit = False
+        db: AsyncSession = Depends(database)):
+    """
+    Remove a runner, and its results.
+    """
 
-    client: Client = db.query(Client).filter(Client.id == runner_id).one_or_none()
+    tokens = await _remove_runners(db, Client.id == runner_id)
+    if not tokens:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Runner not found")
 
-    if client.system is not None:
-        if client.system.raspberry is not None:
-            db.delete(client.system.raspberry)
-        db.delete(client.system)
+    await db.commit()
+    invalidate_client_token(tokens[0])
+    db.expire(admin, ("clients", ))
 
-    if client.docker is not None:
-        db.delete(client.docker)
 
-    if client.cpu is not None:
-        if client.cpu.cache is not None:
-            db.delete(client.cpu.cache)
-        db.delete(client.cpu)
+@app.delete("/runners", summary="Remove runners in bulk", tags=["Bookkeeping"], response_model=models.RemovedRunners)
+async def unregister_all(
+        owner: Optional[str] = Query(None, title="Only runners added by the administrator with this username"),
+        inactive_since: Optional[datetime] = Query(
+            None, title="Only runners that have not published results since this time, or ever"),
+        admin: Admin = Depends(admin_auth),
+        db: AsyncSession = Depends(database)) -> models.RemovedRunners:
+    """
+    Remove decommissioned runners, and their results, in a single transaction. At least one of the criteria is
+    required, and a runner must match all that are given.
+    """
 
-    if client.os is not None:
-        db.delete(client.os)
+    criteria = []
+    if owner is not None:
+        criteria.append(Client.owner_id.in_(select(Admin.id).where(Admin.username == owner)))
+    if inactive_since is not None:
+        criteria.append(or_(Client.last_submitted_at.is_(None), Client.last_submitted_at < inactive_since))
+    if not criteria:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Give an owner, inactive_since, or both")
+
+    tokens = await _remove_runners(db, *criteria)
+    await db.commit()
+    for token in tokens:
+        invalidate_client_token(token)
+    db.expire(admin, ("clients", ))
+    return models.RemovedRunners(removed=len(tokens))
 
-    db.delete(client)
 
-    db.commit()
-    db.expire(admin, ("clients", ))
+@app.post("/runners/{runner_id}/token", summary="Replace a runner's token", tags=["Bookkeeping"], response_model=models.Client)
+async def rotate_token(
+        runner_id: int,
+        _admin: Admin = Depends(admin_auth),
+        db: AsyncSession = Depends(database)) -> models.Client:
+    """
+    Issue a new token for a runner. The old token stops working immediately.
+    """
+
+    client: Optional[Client] = (await db.execute(select(Client).where(Client.id == runner_id))).scalar_one_or_none()
+    if client is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Runner not found")
+
+    old_token = client.token
+    client.token = secrets.token_hex(nbytes=64)
+    await db.execute(bump_version)
+    await db.commit()
+    invalidate_client_token(old_token)
+    return (await _load_clients(db, models.RunnerResults.summary, Client.id == client.id))[0]
+
+
+@app.get("/runners/{runner_id}/results", summary="List a runner's results", tags=["Results"],
+         response_model=List[models.Result])
+async def list_runner_results(
+        runner_id: int,
+        request: Request,
+        after: Optional[int] = Query(None, title="Only results with an id greater than this cursor"),
+        limit: int = Query(100, ge=1, le=1000),
+        filters: ResultFilter = Depends(),
+        db: AsyncSession = Depends(database)) -> Response:
+    """
+    List the results of a runner in ascending id order, one page at a time, like `GET /results`.
+    """
+
+    if (await db.execute(select(Client.id).where(Client.id == runner_id))).scalar_one_or_none() is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Runner not found")
+
+    filters.client_id = runner_id
+    return await _result_page(request, db, filters, after, limit)
 
 
 @app.patch("/runners", summary="Set current runner system info", tags=["Bookkeeping"])
-def set_system_info(props: models.ClientMeta,
-                    client: Client = Depends(client_auth),
-                    db: Session = Depends(database)):
+async def set_system_info(props: models.ClientMeta,
+                          identity: ClientIdentity = Depends(client_auth),
+                          db: AsyncSession = Depends(database)):
     """
     Initialize a runner, and report system properties.
     """
 
-    if client.docker is not None:
-        client.docker.__dict__.update(props.docker.__dict__)
-    else:
-        client.docker = DockerInfo(**props.docker.__dict__)
+    if await store_system_info(db, identity.id, props):
+        await db.execute(bump_version)
+        await db.commit()
 
-    db.add(client.docker)
 
-    if client.system is not None:
-        if props.system.raspberry is not None:
-            if client.system.raspberry is not None:
-                client.system.raspberry.__dict__.update(props.system.raspberry.__dict__)
-            else:
-                client.system.raspberry = RaspberryInfo(props.system.raspberry.__dict__)
-        client.system.__dict__.update({k: v for k, v in props.system.__dict__.items() if k != "raspberry"})
-    else:
-        client.system = SystemInfo(**{k: v for k, v in props.system.__dict__.items() if k != "raspberry"})
-        if props.system.raspberry is not None:
-            client.system.raspberry = RaspberryInfo(props.system.raspberry.__dict__)
+@app.on_event("startup")
+async def start_ingest_queue():
+    if settings.ingest_queue:
+        await ingest_queue.start()
 
-    if client.system.raspberry is not None:
-        db.add(client.system.raspberry)
-    db.add(client.system)
 
-    if client.os is not None:
-        client.os.__dict__.update(props.os.__dict__)
-    else:
-        client.os = OsInfo(**props.os.__dict__)
+@app.on_event("shutdown")
+async def stop_ingest_queue():
+    if settings.ingest_queue:
+        await ingest_queue.stop()
 
-    db.add(client.os)
 
-    if client.cpu is not None:
-        if client.cpu.cache is not None:
-            client.cpu.cache.__dict__.update(props.cpu.cache.__dict__)
-        else:
-            client.cpu.cache = CacheInfo(props.cpu.cache.__dict__)
-        client.cpu.__dict__.update({k: v for k, v in props.cpu.__dict__.items() if k != "cache"})
-    else:
-        client.cpu = CpuInfo(**{k: v for k, v in props.cpu.__dict__.items() if k != "cache"})
-        client.cpu.cache = CacheInfo(**props.cpu.cache.__dict__)
+@app.post("/results", summary="Publish a new result", tags=["Results"],
+          responses={200: {"model": models.PublishedResult}, HTTP_202_ACCEPTED: {"model": models.IngestReceipt}})
+async def publish_result(
+        result: models.Result,
+        response: Response,
+        idempotency_key: Optional[str] = Header(None, max_length=64),
+        client: ClientIdentity = Depends(client_auth),
+        db: AsyncSession = Depends(database)) -> Union[models.PublishedResult, models.IngestReceipt]:
+    """
+    Publish a result. When the ingestion queue is enabled, the result is stored in the background, and the
+    response is `202 Accepted`, or `429 Too Many Requests` when too many results are waiting to be stored.
 
-    db.add(client.cpu.cache)
-    db.add(client.cpu)
+    Submissions can be retried safely when they have an `Idempotency-Key` header, or a run id: a result the
+    runner published before under the same key is not stored again, and its id is returned instead.
+    """
 
-    db.commit()
+    if idempotency_key is not None:
+        result.idempotency_key = idempotency_key
+    result.idempotency_key = ingest.idempotency_key(result)
+    key = result.idempotency_key
+
+    if key is not None:
+        stored = await db.run_sync(ingest.stored_results, client.id, [key])
+        if stored:
+            return models.PublishedResult(id=stored[key], replayed=True)
+
+    if settings.ingest_queue:
+        response.status_code = HTTP_202_ACCEPTED
+        return models.IngestReceipt(ingest_id=await ingest_queue.submit(client.id, [result]))
+
+    try:
+        mappings = await db.run_sync(insert_results, client.id, [result])
+        await db.commit()
+    except IntegrityError:
+        # A concurrent retry stored the result first.
+        await db.rollback()
+        stored = await db.run_sync(ingest.stored_results, client.id, [key]) if key is not None else {}
+        if not stored:
+            raise
+        return models.PublishedResult(id=stored[key], replayed=True)
+
+    await feed_hub.publish_stored(db, mappings)
+    return models.PublishedResult(id=mappings[0]["id"], replayed=False)
+
+
+@app.post("/results/batch", summary="Publish a batch of results", tags=["Results"], response_model=models.BatchStatus)
+async def publish_results(
+        response: Response,
+        rows: List[Any] = Depends(result_batch),
+        client: ClientIdentity = Depends(client_auth),
+        db: AsyncSession = Depends(database)) -> models.BatchStatus:
+    """
+    Publish many results at once, as a JSON array of results, or as newline-delimited JSON
+    (`Content-Type: application/x-ndjson`).
+
+    Every result is validated separately. Valid results are stored in a single transaction, invalid ones are
+    rejected, as are lines of newline-delimited JSON that aren't JSON, and the status of each result is reported
+    in the order in which they were submitted.
+    Results with the idempotency key of a result the runner published before are accepted, but not stored again.
+    When the ingestion queue is enabled, valid results are queued together, and the response is `202 Accepted`.
+    """
 
+    results, status = validate_batch(rows)
+
+    run_id = uuid.uuid4().hex
+    for result in results:
+        result.idempotency_key = ingest.idempotency_key(result)
+        if result.run_id is None:
+            result.run_id = run_id
+
+    if results and settings.ingest_queue:
+        response.status_code = HTTP_202_ACCEPTED
+        status.ingest_id = await ingest_queue.submit(client.id, results)
+    elif results:
+        try:
+            mappings = await db.run_sync(insert_results, client.id, results)
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise HTTPException(
+                status_code=HTTP_409_CONFLICT,
+                detail="Some of these results were stored concurrently, submit the batch again",
+            )
+        await feed_hub.publish_stored(db, mappings)
+
+    return status
+
+
+async def _result_page(
+        request: Request,
+        db: AsyncSession,
+        filters: ResultFilter,
+        after: Optional[int],
+        limit: int) -> Response:
+    async def render():
+        query = filters.apply(result_query())
+        if after is not None:
+            query = query.where(Result.id > after)
+
+        rows = (await db.execute(query.order_by(Result.id).limit(limit))).all()
+
+        headers = {}
+        if len(rows) == limit:
+            next_url = request.url.include_query_params(after=rows[-1].id)
+            headers["Link"] = f'<{next_url}>; rel="next"'
+
+        return await result_dicts(db, rows), headers
+
+    return await conditional_response(request, db, render)
+
+
+@app.get("/results", summary="List results", tags=["Results"], response_model=List[models.Result])
+async def list_results(
+        request: Request,
+        after: Optional[int] = Query(None, title="Only results with an id greater than this cursor"),
+        limit: int = Query(100, ge=1, le=1000),
+        filters: ResultFilter = Depends(),
+        db: AsyncSession = Depends(database)) -> Response:
+    """
+    List results in ascending id order, one page at a time.
 
-@app.post("/results", summary="Publish a new result", tags=["Results"])
-def publish_result(
-        result: models.Result,
-        client: Client = Depends(client_auth),
-        db: Session = Depends(database)):
-    result = Result(
-        **{
-            **result.__dict__,
-            "client_id": client.id,
-        }
+    When more results may be available, a `Link` header with `rel="next"` points to the next page.
+    Supports conditional requests through `ETag` and `If-None-Match`.
+    """
+
+    return await _result_page(request, db, filters, after, limit)
+
+
+@app.get("/results/feed", summary="Follow new results", tags=["Results"], response_class=StreamingResponse,
+         responses={200: {"content": {FEED_MEDIA_TYPE: {}}}})
+async def follow_results(
+        request: Request,
+        filters: ResultFilter = Depends(),
+        after: Optional[int] = Query(None, title="Also send the results after this result id first"),
+        last_event_id: Optional[int] = Header(None)) -> StreamingResponse:
+    """
+    Stream results as they are published, as server-sent events, instead of polling `GET /results`.
+    Every result is a `result` event, with the result as its data and its id as the event id.
+
+    To catch up after a disconnect, pass the last id received as `after`, or as the `Last-Event-ID` header,
+    which browsers send by themselves when they reconnect. When a subscriber reads too slowly, the oldest
+    results waiting for it are dropped, and a `dropped` event reports how many were.
+
+    Results are broadcast by the worker process that stored them, so with several workers, only those stored
+    by the worker serving the feed are sent live.
+    """
+
+    if last_event_id is not None:
+        after = last_event_id
+    return StreamingResponse(
+        stream_feed(filters, after, request.is_disconnected),
+        media_type=FEED_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.get("/results/export", summary="Export results", tags=["Results"], response_class=StreamingResponse)
+async def export_results(
+        format: ExportFormat = Query(ExportFormat.ndjson),
+        filters: ResultFilter = Depends()) -> StreamingResponse:
+    """
+    Stream all matching results, in ascending id order, as newline-delimited JSON or CSV.
+    """
+
+    return StreamingResponse(
+        stream_results(filters, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="results.{format.value}"'},
+    )
+
+
+@app.post("/results/archive", summary="Archive old results", tags=["Results"], response_model=models.ArchiveStatus)
+async def archive_old_results(
+        before: datetime = Query(..., title="Archive results submitted before this time"),
+        _admin: Admin = Depends(admin_auth),
+        db: AsyncSession = Depends(database)) -> models.ArchiveStatus:
+    """
+    Move results submitted before a point in time out of the database, into gzipped newline-delimited JSON
+    files, one per month, in the configured archive directory. This keeps queries over recent results fast
+    as history grows.
+    """
+
+    return await archive_results(db, before, settings.archive_directory)
+
+
+@app.get("/results/compare", summary="Compare two sets of results", tags=["Results"], response_model=models.Comparison)
+async def compare_results(
+        request: Request,
+        a: ResultSelector = Depends(result_selector("a")),
+        b: ResultSelector = Depends(result_selector("b")),
+        confidence: float = Query(0.95, gt=0, lt=1),
+        db: AsyncSession = Depends(database)) -> Response:
+    """
+    Compare the passes per second of two sets of results, selected by query parameters prefixed with `a.` and `b.`,
+    e.g. `?a.implementation=rust&b.implementation=zig&a.solution=1&b.solution=1`.
+
+    Reports both distributions, with confidence intervals of their medians and of the ratio between them, and
+    a Mann-Whitney U test of whether one tends to be faster than the other.
+    Supports conditional requests through `ETag` and `If-None-Match`.
+    """
+
+    async def render():
+        snapshot = await snapshot_store.current(db) if snapshot_store is not None else None
+        return analysis.compare(
+            await passes_per_second(db, a, snapshot), await passes_per_second(db, b, snapshot), confidence
+        ), {}
+
+    return await conditional_response(request, db, render)
+
+
+@app.get("/results/snapshot", summary="Download a columnar snapshot of the results", tags=["Results"],
+         response_class=StreamingResponse, responses={200: {"content": {"application/octet-stream": {}}}})
+async def download_snapshot(db: AsyncSession = Depends(database)) -> StreamingResponse:
+    """
+    Download the results as a NumPy `.npz` archive, for offline analysis, e.g. with `numpy.load`. It holds an
+    array per column, `id`, `client_id`, `passes`, `duration`, `threads` and `submitted_at`, and for
+    `implementation`, `solution` and `label`, codes into an array of their values, e.g. `implementation_values`,
+    with -1 standing for none. Tags and run ids are not included.
+
+    Only available when `AGGREGATOR_SNAPSHOT_DIRECTORY` is set.
+    """
+
+    if snapshot_store is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Snapshots are not enabled")
+
+    snapshot = await snapshot_store.current(db)
+    return StreamingResponse(
+        npz_chunks(snapshot),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="results-{snapshot.version}.npz"'},
     )
-    db.add(result)
-    db.commit()
-    db.expire(result, ("id", ))
-    db.expire(client, ("results", ))
 
 
-@app.get("/results", summary="List all results", tags=["Results"], response_model=List[models.Result])
-def list_results(db: Session = Depends(database)):
-    results: List[Result] = db.query(Result).all()
-    return [models.Result.from_orm(result) for result in results]
+@app.get("/leaderboard", summary="Rank implementations", tags=["Results"], response_model=List[models.LeaderboardEntry])
+async def list_leaderboard(
+        request: Request,
+        implementation: Optional[str] = Query(None),
+        solution: Optional[str] = Query(None),
+        label: Optional[str] = Query(None),
+        threads: Optional[int] = Query(None),
+        cpu_brand: Optional[str] = Query(None),
+        architecture: Optional[str] = Query(None),
+        order_by: models.LeaderboardOrder = Query(models.LeaderboardOrder.best),
+        limit: int = Query(100, ge=1, le=1000),
+        db: AsyncSession = Depends(database)) -> Response:
+    """
+    Passes per second of every combination of implementation, solution, label, thread count, CPU brand and
+    architecture, best first. The figures are maintained as results are published, so ranking doesn't scan results.
+    Supports conditional requests through `ETag` and `If-None-Match`.
+    """
+
+    query = select(LeaderboardEntry)
+    for column, value in (
+            (LeaderboardEntry.implementation, implementation),
+            (LeaderboardEntry.solution, solution),
+            (LeaderboardEntry.label, label),
+            (LeaderboardEntry.threads, threads),
+            (LeaderboardEntry.cpu_brand, cpu_brand),
+            (LeaderboardEntry.architecture, architecture)):
+        if value is not None:
+            query = query.where(column == value)
+
+    order = {
+        models.LeaderboardOrder.best: LeaderboardEntry.best_passes_per_second,
+        models.LeaderboardOrder.mean: LeaderboardEntry.mean_passes_per_second,
+        models.LeaderboardOrder.count: LeaderboardEntry.result_count,
+    }[order_by]
+
+    async def render():
+        entries: List[LeaderboardEntry] = (await db.execute(
+            query.order_by(order.desc(), LeaderboardEntry.id).limit(limit)
+        )).scalars().all()
+        return [leaderboard.to_model(entry) for entry in entries], {}
+
+    return await conditional_response(request, db, render)
+
+
+@app.post("/leaderboard/rebuild", summary="Recompute the leaderboard", tags=["Results"])
+async def rebuild_leaderboard(
+        _admin: Admin = Depends(admin_auth),
+        db: AsyncSession = Depends(database)):
+    """
+    Recompute the leaderboard, and the result summaries of runners, from all results.
+    This is only needed when archiving results was interrupted.
+    """
+
+    await db.run_sync(leaderboard.rebuild)
+    await db.run_sync(runner_stats.rebuild)
+    await db.execute(bump_version)
+    await db.commit()
+
+
+@app.post("/jobs", summary="Queue benchmark jobs", tags=["Jobs"], response_model=List[models.Job])
+async def queue_jobs(
+        requests: List[models.JobRequest],
+        _admin: Admin = Depends(admin_auth),
+        db: AsyncSession = Depends(database)) -> List[models.Job]:
+    """
+    Queue jobs for runners to pick up through `GET /jobs/next`.
+    """
+
+    queued = await jobs.create_jobs(db, requests)
+    await db.commit()
+    jobs.notify_waiters()
+    return [models.Job.from_orm(job) for job in queued]
+
+
+@app.get("/jobs", summary="List benchmark jobs", tags=["Jobs"], response_model=List[models.Job])
+async def list_jobs(
+        status: Optional[models.JobStatus] = Query(None),
+        after: Optional[int] = Query(None, title="Only jobs with an id greater than this cursor"),
+        limit: int = Query(100, ge=1, le=1000),
+        _admin: Admin = Depends(admin_auth),
+        db: AsyncSession = Depends(database)) -> List[models.Job]:
+    query = select(Job).order_by(Job.id).limit(limit)
+    if status is not None:
+        query = query.where(Job.status == status.value)
+    if after is not None:
+        query = query.where(Job.id > after)
+    return [models.Job.from_orm(job) for job in (await db.execute(query)).scalars()]
+
+
+@app.get("/jobs/next", summary="Lease the next job", tags=["Jobs"], response_model=models.Job,
+         responses={HTTP_204_NO_CONTENT: {"description": "No job became available in time"}})
+async def lease_job(
+        wait: float = Query(30.0, ge=0, le=60, title="Seconds to wait for a job to become available"),
+        client: ClientIdentity = Depends(client_auth),
+        db: AsyncSession = Depends(database)):
+    """
+    Lease the most urgent pending job that fits the runner: one that needs no more CPUs than the runner has free,
+    according to the CPU count it reported, and that either runs on any architecture, or on the runner's.
+    Larger jobs are handed out first, to the runners that can fit them.
+
+    When no job is available, the request waits up to `wait` seconds for one, and answers with `204 No Content`
+    if none came. The runner must send heartbeats to keep the lease, and submit the job's results with its
+    `run_id`. A job whose lease expires is handed out again, until it runs out of attempts.
+    """
+
+    job = await jobs.next_job(db, client.id, wait)
+    if job is None:
+        return Response(status_code=HTTP_204_NO_CONTENT)
+    return models.Job.from_orm(job)
+
+
+async def _leased_job(db: AsyncSession, client: ClientIdentity, job_id: int) -> Job:
+    job = await jobs.leased_job(db, client.id, job_id)
+    if job is None:
+        raise HTTPException(status_code=HTTP_409_CONFLICT, detail="The job is not leased to this runner")
+    return job
+
+
+@app.post("/jobs/{job_id}/heartbeat", summary="Extend a job's lease", tags=["Jobs"], response_model=models.Job)
+async def heartbeat_job(
+        job_id: int,
+        client: ClientIdentity = Depends(client_auth),
+        db: AsyncSession = Depends(database)) -> models.Job:
+    """
+    Extend the lease of a job the runner is running. Fails with `409 Conflict` when the lease was lost, in which
+    case the runner should abandon the job.
+    """
+
+    job = await _leased_job(db, client, job_id)
+    jobs.extend_lease(job)
+    await db.commit()
+    return models.Job.from_orm(job)
+
+
+@app.post("/jobs/{job_id}/complete", summary="Complete a job", tags=["Jobs"], response_model=models.Job)
+async def complete_job(
+        job_id: int,
+        outcome: models.JobOutcome,
+        client: ClientIdentity = Depends(client_auth),
+        db: AsyncSession = Depends(database)) -> models.Job:
+    """
+    Report that a job finished, successfully or not, which frees the runner's CPUs for its next job.
+    """
+
+    job = await _leased_job(db, client, job_id)
+    jobs.finish_job(job, outcome)
+    await db.commit()
+    jobs.notify_waiters()
+    return models.Job.from_orm(job)
+
+
+@app.get("/metrics", summary="Prometheus metrics", tags=["Status"], response_class=PlainTextResponse)
+async def prometheus_metrics() -> PlainTextResponse:
+    """
+    Request latencies and database queries per route, database query times and password hashing times,
+    in the Prometheus text format.
+    """
+
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/status", summary="Service status", tags=["Status"])
+async def status(_admin: Admin = Depends(admin_auth)) -> Dict[str, Any]:
+    """
+    Report the state of the service's in-process caches, of the live feed, and of the ingestion queue, when it is
+    enabled.
+    """
+
+    return {
+        "auth_cache": client_cache.stats(),
+        "admin_cache": admin_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "ingest_queue": ingest_queue.stats() if settings.ingest_queue else None,
+        "feed": feed_hub.stats(),
+    }
@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Tuple, List, Sequence, Optional, Callable, Awaitable
+
+import greenlet
+from fastapi import Request, Response
+from starlette.routing import Match
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class Histogram:
+    """
+    A thread-safe Prometheus histogram, with a series for every combination of label values.
+    """
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float], labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        # Per series, the number of observations in every bucket, and above the last, and their sum.
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = ([0] * (len(self.buckets) + 1), [0.0])
+            counts, total = series
+            counts[bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, (list(counts), total[0])) for labels, (counts, total) in self._series.items())
+
+        for label_values, (counts, total) in series:
+            labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, label_values)]
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                bucket_labels = ",".join((*labels, f'le="{bound}"'))
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            suffix = f'{{{",".join(labels)}}}' if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+request_duration = Histogram(
+    "aggregator_http_request_duration_seconds", "Time until the response headers are sent, by route.",
+    LATENCY_BUCKETS, ("method", "route", "status"),
+)
+request_queries = Histogram(
+    "aggregator_http_request_queries", "Number of database queries per request, by route.",
+    QUERY_COUNT_BUCKETS, ("method", "route"),
+)
+request_query_duration = Histogram(
+    "aggregator_http_request_query_seconds", "Time spent in database queries per request, by route.",
+    LATENCY_BUCKETS, ("method", "route"),
+)
+query_duration = Histogram(
+    "aggregator_db_query_duration_seconds", "Time spent in every database query.",
+    LATENCY_BUCKETS,
+)
+password_hash_duration = Histogram(
+    "aggregator_password_hash_duration_seconds", "Time spent hashing and verifying passwords, by operation.",
+    LATENCY_BUCKETS, ("operation",),
+)
+
+HISTOGRAMS = [request_duration, request_queries, request_query_duration, query_duration, password_hash_duration]
+
+
+def render() -> str:
+    return "\n".join(line for histogram in HISTOGRAMS for line in histogram.render()) + "\n"
+
+
+class RequestStats:
+    """
+    The database queries of a single request.
+    """
+
+    def __init__(self, record_statements: bool):
+        self.queries = 0
+        self.query_seconds = 0.0
+        # (seconds, statement) of every query, only when they are logged for slow requests.
+        self.statements: Optional[List[Tuple[float, str]]] = [] if record_statements else None
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def _current_request_stats() -> Optional[RequestStats]:
+    stats = _request_stats.get()
+    # Depending on the greenlet version, the greenlets in which SQLAlchemy runs the queries of asyncio sessions
+    # may start with an empty context, rather than the one of the task awaiting them.
+    parent = greenlet.getcurrent().parent
+    while stats is None and parent is not None:
+        if parent.gr_context is not None:
+            stats = parent.gr_context.get(_request_stats)
+        parent = parent.parent
+    return stats
+
+
+def before_cursor_execute(conn, _cursor, _statement, _parameters, _context, _executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, _cursor, statement, _parameters, _context, _executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    query_duration.observe(elapsed)
+
+    stats = _current_request_stats()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += elapsed
+        if stats.statements is not None:
+            stats.statements.append((elapsed, statement))
+
+
+def handle_error(exception_context):
+    # A failed query never reaches `after_cursor_execute`.
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def _route(request: Request) -> str:
+    # Route templates rather than paths, so that runner ids don't each get their own series.
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+async def measure_request(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+    """
+    Middleware that records the latency and the database queries of every request, and logs slow requests
+    with their queries when `settings.slow_request_seconds` is set.
+    """
+
+    route = _route(request)
+    threshold = settings.slow_request_seconds
+    stats = RequestStats(record_statements=threshold is not None)
+    token = _request_stats.set(stats)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        _request_stats.reset(token)
+
+        request_duration.observe(elapsed, request.method, route, str(status))
+        request_queries.observe(stats.queries, request.method, route)
+        request_query_duration.observe(stats.query_seconds, request.method, route)
+
+        if threshold is not None and elapsed >= threshold:
+            logger.warning(
+                "Slow request: %s %s took %.3fs, of which %.3fs in %d queries:\n%s",
+                request.method, request.url.path, elapsed, stats.query_seconds, stats.queries,
+                "\n".join(f"  {seconds:.4f}s {statement}" for seconds, statement in stats.statements),
+            )
@@ -1,3 +1,4 @@
+import os
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
@@ -5,13 +6,23 @@ from sqlalchemy import pool
 
 from alembic import context
 
+from db import sync_url
 from dbmodels import Base
 
 config = context.config
 fileConfig(config.config_file_name)
+
+# The service's own database setting takes precedence over alembic.ini, so that both always agree.
+if "AGGREGATOR_DATABASE_URL" in os.environ:
+    config.set_main_option("sqlalchemy.url", sync_url(os.environ["AGGREGATOR_DATABASE_URL"]).replace("%", "%%"))
 target_metadata = Base.metadata
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    # SQLite keeps the last ids of AUTOINCREMENT tables in a table of its own, which isn't part of the models.
+    return not (type_ == "table" and name == "sqlite_sequence")
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -30,6 +41,7 @@ def run_migrations_offline():
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -51,7 +63,7 @@ def run_migrations_online():
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_object=include_object
         )
 
         with context.begin_transaction():
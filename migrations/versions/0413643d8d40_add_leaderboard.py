@@ -0,0 +1,125 @@
+"""Add leaderboard
+
+Revision ID: 0413643d8d40
+Revises: abbe981722b3
+Create Date: 2026-10-18 12:20:05.331187+02:00
+
+"""
+import math
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0413643d8d40'
+down_revision = 'abbe981722b3'
+branch_labels = None
+depends_on = None
+
+CHUNK_SIZE = 10000
+# The leaderboard's buckets per doubling of passes per second, as of this revision.
+BUCKETS_PER_OCTAVE = 16
+GROUP_COLUMNS = ['implementation', 'solution', 'label', 'threads', 'cpu_brand', 'architecture']
+
+results = sa.table(
+    'results',
+    sa.column('id', sa.Integer()),
+    sa.column('client_id', sa.Integer()),
+    sa.column('implementation', sa.String()),
+    sa.column('solution', sa.String()),
+    sa.column('label', sa.String()),
+    sa.column('threads', sa.Integer()),
+    sa.column('passes', sa.Integer()),
+    sa.column('duration', sa.Float()),
+)
+clients = sa.table(
+    'clients',
+    sa.column('id', sa.Integer()),
+    sa.column('cpu_id', sa.Integer()),
+    sa.column('os_id', sa.Integer()),
+    sa.column('docker_id', sa.Integer()),
+)
+cpu_info = sa.table('cpu_info', sa.column('id', sa.Integer()), sa.column('brand', sa.String()))
+os_info = sa.table('os_info', sa.column('id', sa.Integer()), sa.column('arch', sa.String()))
+docker_info = sa.table('docker_info', sa.column('id', sa.Integer()), sa.column('architecture', sa.String()))
+
+
+def _account_results(leaderboard):
+    query = sa.select(
+        results.c.id, results.c.implementation, results.c.solution, results.c.label, results.c.threads,
+        results.c.passes, results.c.duration, cpu_info.c.brand,
+        sa.func.coalesce(docker_info.c.architecture, os_info.c.arch),
+    ).select_from(
+        results.outerjoin(clients, results.c.client_id == clients.c.id)
+        .outerjoin(cpu_info, clients.c.cpu_id == cpu_info.c.id)
+        .outerjoin(os_info, clients.c.os_id == os_info.c.id)
+        .outerjoin(docker_info, clients.c.docker_id == docker_info.c.id)
+    ).where(
+        results.c.implementation.isnot(None), results.c.solution.isnot(None), results.c.label.isnot(None),
+        results.c.threads.isnot(None), results.c.passes > 0, results.c.duration > 0,
+    )
+
+    connection = op.get_bind()
+    groups = {}
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            query.where(results.c.id > last_id).order_by(results.c.id).limit(CHUNK_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+
+        for id, implementation, solution, label, threads, passes, duration, cpu_brand, architecture in rows:
+            key = (implementation, solution, label, threads, cpu_brand or '', architecture or '')
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {
+                    'result_count': 0, 'best_passes_per_second': None, 'best_result_id': None,
+                    'mean_passes_per_second': 0.0, 'm2_passes_per_second': 0.0, 'histogram': {},
+                }
+
+            # Welford's algorithm, which the leaderboard's batched merges agree with.
+            value = passes / duration
+            group['result_count'] += 1
+            delta = value - group['mean_passes_per_second']
+            group['mean_passes_per_second'] += delta / group['result_count']
+            group['m2_passes_per_second'] += delta * (value - group['mean_passes_per_second'])
+            if group['best_passes_per_second'] is None or value > group['best_passes_per_second']:
+                group['best_passes_per_second'] = value
+                group['best_result_id'] = id
+            bucket = str(math.floor(math.log2(value) * BUCKETS_PER_OCTAVE))
+            group['histogram'][bucket] = group['histogram'].get(bucket, 0) + 1
+        last_id = rows[-1][0]
+
+    if groups:
+        op.bulk_insert(leaderboard, [dict(zip(GROUP_COLUMNS, key), **group) for key, group in groups.items()])
+
+
+def upgrade():
+    leaderboard = op.create_table('leaderboard',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('implementation', sa.String(), nullable=False),
+    sa.Column('solution', sa.String(), nullable=False),
+    sa.Column('label', sa.String(), nullable=False),
+    sa.Column('threads', sa.Integer(), nullable=False),
+    sa.Column('cpu_brand', sa.String(), nullable=False),
+    sa.Column('architecture', sa.String(), nullable=False),
+    sa.Column('result_count', sa.Integer(), nullable=False),
+    sa.Column('best_passes_per_second', sa.Float(), nullable=True),
+    sa.Column('best_result_id', sa.Integer(), nullable=True),
+    sa.Column('mean_passes_per_second', sa.Float(), nullable=False),
+    sa.Column('m2_passes_per_second', sa.Float(), nullable=False),
+    sa.Column('histogram', sa.JSON(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('implementation', 'solution', 'label', 'threads', 'cpu_brand', 'architecture', name='uq_leaderboard_group')
+    )
+    op.create_index(op.f('ix_leaderboard_best_passes_per_second'), 'leaderboard', ['best_passes_per_second'], unique=False)
+    op.create_index(op.f('ix_leaderboard_id'), 'leaderboard', ['id'], unique=False)
+    _account_results(leaderboard)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_leaderboard_id'), table_name='leaderboard')
+    op.drop_index(op.f('ix_leaderboard_best_passes_per_second'), table_name='leaderboard')
+    op.drop_table('leaderboard')
@@ -0,0 +1,29 @@
+"""Add result run id and time range index
+
+Revision ID: 167f0895b7a6
+Revises: cb5bd0b20157
+Create Date: 2026-10-18 15:02:44.819263+02:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '167f0895b7a6'
+down_revision = 'cb5bd0b20157'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('results', sa.Column('run_id', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_results_run_id'), 'results', ['run_id'], unique=False)
+    op.create_index('ix_results_client_id_submitted_at', 'results', ['client_id', 'submitted_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_results_client_id_submitted_at', table_name='results')
+    op.drop_index(op.f('ix_results_run_id'), table_name='results')
+    with op.batch_alter_table('results') as batch_op:
+        batch_op.drop_column('run_id')
@@ -0,0 +1,61 @@
+"""Store result hardware
+
+Revision ID: 1c4d2b9d695c
+Revises: 2ee7c2da96ee
+Create Date: 2026-10-18 19:02:41.518306+02:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c4d2b9d695c'
+down_revision = '2ee7c2da96ee'
+branch_labels = None
+depends_on = None
+
+results = sa.table(
+    'results',
+    sa.column('client_id', sa.Integer()),
+    sa.column('cpu_brand', sa.String()),
+    sa.column('architecture', sa.String()),
+)
+clients = sa.table(
+    'clients',
+    sa.column('id', sa.Integer()),
+    sa.column('cpu_id', sa.Integer()),
+    sa.column('os_id', sa.Integer()),
+    sa.column('docker_id', sa.Integer()),
+)
+cpu_info = sa.table('cpu_info', sa.column('id', sa.Integer()), sa.column('brand', sa.String()))
+os_info = sa.table('os_info', sa.column('id', sa.Integer()), sa.column('arch', sa.String()))
+docker_info = sa.table('docker_info', sa.column('id', sa.Integer()), sa.column('architecture', sa.String()))
+
+
+def _runner_hardware(column):
+    # The hardware the leaderboard grouped the results by so far, the one their runners have now.
+    return sa.func.coalesce(
+        sa.select(column).select_from(
+            clients.outerjoin(cpu_info, clients.c.cpu_id == cpu_info.c.id)
+            .outerjoin(os_info, clients.c.os_id == os_info.c.id)
+            .outerjoin(docker_info, clients.c.docker_id == docker_info.c.id)
+        ).where(clients.c.id == results.c.client_id).scalar_subquery(),
+        '',
+    )
+
+
+def upgrade():
+    op.add_column('results', sa.Column('cpu_brand', sa.String(), server_default='', nullable=False))
+    op.add_column('results', sa.Column('architecture', sa.String(), server_default='', nullable=False))
+    op.execute(results.update().values(
+        cpu_brand=_runner_hardware(cpu_info.c.brand),
+        architecture=_runner_hardware(sa.func.coalesce(docker_info.c.architecture, os_info.c.arch)),
+    ))
+
+
+def downgrade():
+    # The table is recreated on SQLite, which must keep handing out new ids.
+    with op.batch_alter_table('results', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.drop_column('architecture')
+        batch_op.drop_column('cpu_brand')
@@ -0,0 +1,36 @@
+"""Never reuse result ids
+
+Revision ID: 2ee7c2da96ee
+Revises: a2afed460545
+Create Date: 2026-10-18 18:24:07.361840+02:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2ee7c2da96ee'
+down_revision = 'a2afed460545'
+branch_labels = None
+depends_on = None
+
+
+def _recreate_results(autoincrement: bool):
+    # Only SQLite hands out the ids of deleted rows again. It can't add AUTOINCREMENT to a table, so batch mode
+    # copies the results into a new one. Ids that were deleted already may still be handed out once more.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('results', recreate='always', table_kwargs={'sqlite_autoincrement': autoincrement}):
+        pass
+
+
+def upgrade():
+    op.add_column('data_version', sa.Column('result_deletions', sa.Integer(), server_default='0', nullable=False))
+    _recreate_results(autoincrement=True)
+
+
+def downgrade():
+    _recreate_results(autoincrement=False)
+    with op.batch_alter_table('data_version') as batch_op:
+        batch_op.drop_column('result_deletions')
@@ -0,0 +1,24 @@
+"""Add runner system info hash
+
+Revision ID: 33c400eb7ac1
+Revises: 711e200a1a55
+Create Date: 2026-10-18 13:48:12.660429+02:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '33c400eb7ac1'
+down_revision = '711e200a1a55'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('clients', sa.Column('meta_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    op.drop_column('clients', 'meta_hash')
@@ -0,0 +1,29 @@
+"""Add data version
+
+Revision ID: 711e200a1a55
+Revises: 0413643d8d40
+Create Date: 2026-10-18 13:05:48.902166+02:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '711e200a1a55'
+down_revision = '0413643d8d40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    data_version = op.create_table('data_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(data_version, [{'id': 1, 'version': 1}])
+
+
+def downgrade():
+    op.drop_table('data_version')
@@ -0,0 +1,42 @@
+"""Cascade runner deletion
+
+Revision ID: 758b0eb29d3c
+Revises: cabeb596b474
+Create Date: 2026-10-18 17:12:45.608213+02:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '758b0eb29d3c'
+down_revision = 'cabeb596b474'
+branch_labels = None
+depends_on = None
+
+# The foreign keys are unnamed on SQLite, so batch mode names them as PostgreSQL does by default.
+naming_convention = {"fk": "%(table_name)s_%(column_0_name)s_fkey"}
+
+foreign_keys = [
+    ('results', 'client_id', 'clients', 'CASCADE'),
+    ('result_tags', 'result_id', 'results', 'CASCADE'),
+    ('runner_bests', 'client_id', 'clients', 'CASCADE'),
+    ('jobs', 'client_id', 'clients', 'SET NULL'),
+]
+
+
+def _replace_foreign_keys(cascade: bool):
+    for table, column, referred, ondelete in foreign_keys:
+        name = f'{table}_{column}_fkey'
+        with op.batch_alter_table(table, naming_convention=naming_convention) as batch_op:
+            batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete if cascade else None)
+
+
+def upgrade():
+    _replace_foreign_keys(cascade=True)
+
+
+def downgrade():
+    _replace_foreign_keys(cascade=False)
@@ -0,0 +1,99 @@
+"""Store tags and flags without pickle
+
+Revision ID: abbe981722b3
+Revises: c84d6f291103
+Create Date: 2026-10-18 11:02:17.518302+02:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'abbe981722b3'
+down_revision = 'c84d6f291103'
+branch_labels = None
+depends_on = None
+
+CHUNK_SIZE = 1000
+
+results = sa.table(
+    'results',
+    sa.column('id', sa.Integer()),
+    sa.column('tags', sa.PickleType()),
+)
+result_tags = sa.table(
+    'result_tags',
+    sa.column('result_id', sa.Integer()),
+    sa.column('key', sa.String()),
+    sa.column('value', sa.String()),
+)
+
+
+def _convert_flags(from_type, to_type):
+    cpu_info = sa.table('cpu_info', sa.column('id', sa.Integer()), sa.column('flags', from_type))
+    connection = op.get_bind()
+    flags = connection.execute(sa.select(cpu_info.c.id, cpu_info.c.flags)).fetchall()
+
+    with op.batch_alter_table('cpu_info') as batch_op:
+        batch_op.drop_column('flags')
+    with op.batch_alter_table('cpu_info') as batch_op:
+        batch_op.add_column(sa.Column('flags', to_type, nullable=True))
+
+    cpu_info = sa.table('cpu_info', sa.column('id', sa.Integer()), sa.column('flags', to_type))
+    for id, value in flags:
+        connection.execute(cpu_info.update().where(cpu_info.c.id == id).values(flags=value))
+
+
+def upgrade():
+    op.create_table('result_tags',
+    sa.Column('result_id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('value', sa.String(), nullable=True),
+    sa.ForeignKeyConstraint(['result_id'], ['results.id'], ),
+    sa.PrimaryKeyConstraint('result_id', 'key')
+    )
+    op.create_index('ix_result_tags_key_value_result_id', 'result_tags', ['key', 'value', 'result_id'], unique=False)
+
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(results.c.id, results.c.tags)
+            .where(results.c.id > last_id)
+            .order_by(results.c.id)
+            .limit(CHUNK_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+
+        tags = [
+            {'result_id': id, 'key': str(key), 'value': str(value)}
+            for id, result_tags_dict in rows
+            for key, value in (result_tags_dict or {}).items()
+        ]
+        if tags:
+            op.bulk_insert(result_tags, tags)
+        last_id = rows[-1][0]
+
+    with op.batch_alter_table('results') as batch_op:
+        batch_op.drop_column('tags')
+
+    _convert_flags(sa.PickleType(), sa.String())
+
+
+def downgrade():
+    _convert_flags(sa.String(), sa.PickleType())
+
+    with op.batch_alter_table('results') as batch_op:
+        batch_op.add_column(sa.Column('tags', sa.PickleType(), nullable=True))
+
+    connection = op.get_bind()
+    tags = {}
+    for result_id, key, value in connection.execute(sa.select(result_tags.c.result_id, result_tags.c.key, result_tags.c.value)):
+        tags.setdefault(result_id, {})[key] = value
+    for result_id, result_tags_dict in tags.items():
+        connection.execute(results.update().where(results.c.id == result_id).values(tags=result_tags_dict))
+
+    op.drop_index('ix_result_tags_key_value_result_id', table_name='result_tags')
+    op.drop_table('result_tags')
@@ -0,0 +1,82 @@
+"""Add runner result summaries
+
+Revision ID: b2393e51f115
+Revises: 167f0895b7a6
+Create Date: 2026-10-18 15:47:20.563918+02:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2393e51f115'
+down_revision = '167f0895b7a6'
+branch_labels = None
+depends_on = None
+
+clients = sa.table(
+    'clients',
+    sa.column('id', sa.Integer()),
+    sa.column('result_count', sa.Integer()),
+    sa.column('last_result_id', sa.Integer()),
+    sa.column('last_submitted_at', sa.DateTime()),
+)
+results = sa.table(
+    'results',
+    sa.column('id', sa.Integer()),
+    sa.column('client_id', sa.Integer()),
+    sa.column('implementation', sa.String()),
+    sa.column('passes', sa.Integer()),
+    sa.column('duration', sa.Float()),
+    sa.column('submitted_at', sa.DateTime()),
+)
+runner_bests = sa.table(
+    'runner_bests',
+    sa.column('client_id', sa.Integer()),
+    sa.column('implementation', sa.String()),
+    sa.column('best_passes_per_second', sa.Float()),
+    sa.column('best_result_id', sa.Integer()),
+)
+
+
+def upgrade():
+    op.add_column('clients', sa.Column('result_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('clients', sa.Column('last_result_id', sa.Integer(), nullable=True))
+    op.add_column('clients', sa.Column('last_submitted_at', sa.DateTime(), nullable=True))
+    op.create_table('runner_bests',
+    sa.Column('client_id', sa.Integer(), nullable=False),
+    sa.Column('implementation', sa.String(), nullable=False),
+    sa.Column('best_passes_per_second', sa.Float(), nullable=False),
+    sa.Column('best_result_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['client_id'], ['clients.id'], ),
+    sa.PrimaryKeyConstraint('client_id', 'implementation')
+    )
+
+    own_results = results.c.client_id == clients.c.id
+    op.execute(clients.update().values(
+        result_count=sa.select(sa.func.count(results.c.id)).where(own_results).scalar_subquery(),
+        last_result_id=sa.select(sa.func.max(results.c.id)).where(own_results).scalar_subquery(),
+        last_submitted_at=sa.select(sa.func.max(results.c.submitted_at)).where(own_results).scalar_subquery(),
+    ))
+
+    value = sa.cast(results.c.passes, sa.Float()) / results.c.duration
+    op.execute(runner_bests.insert().from_select(
+        ['client_id', 'implementation', 'best_passes_per_second', 'best_result_id'],
+        sa.select(results.c.client_id, results.c.implementation, sa.func.max(value), sa.func.max(results.c.id))
+        .where(results.c.client_id.isnot(None), results.c.passes > 0, results.c.duration > 0)
+        .group_by(results.c.client_id, results.c.implementation),
+    ))
+    op.execute(runner_bests.update().values(best_result_id=sa.select(sa.func.min(results.c.id)).where(
+        results.c.client_id == runner_bests.c.client_id,
+        results.c.implementation == runner_bests.c.implementation,
+        value == runner_bests.c.best_passes_per_second,
+    ).scalar_subquery()))
+
+
+def downgrade():
+    op.drop_table('runner_bests')
+    with op.batch_alter_table('clients') as batch_op:
+        batch_op.drop_column('last_submitted_at')
+        batch_op.drop_column('last_result_id')
+        batch_op.drop_column('result_count')
@@ -0,0 +1,32 @@
+"""Add result submission time and pagination indexes
+
+Revision ID: c84d6f291103
+Revises: a7625f5e83eb
+Create Date: 2026-10-18 10:12:41.204117+02:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c84d6f291103'
+down_revision = 'a7625f5e83eb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('results', sa.Column('submitted_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_results_submitted_at'), 'results', ['submitted_at'], unique=False)
+    op.create_index('ix_results_implementation_solution_id', 'results', ['implementation', 'solution', 'id'], unique=False)
+    op.create_index('ix_results_label_id', 'results', ['label', 'id'], unique=False)
+    op.create_index('ix_results_client_id_id', 'results', ['client_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_results_client_id_id', table_name='results')
+    op.drop_index('ix_results_label_id', table_name='results')
+    op.drop_index('ix_results_implementation_solution_id', table_name='results')
+    op.drop_index(op.f('ix_results_submitted_at'), table_name='results')
+    op.drop_column('results', 'submitted_at')
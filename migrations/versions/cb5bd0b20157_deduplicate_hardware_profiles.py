@@ -0,0 +1,176 @@
+"""Deduplicate hardware profiles
+
+Revision ID: cb5bd0b20157
+Revises: 33c400eb7ac1
+Create Date: 2026-10-18 14:31:05.207316+02:00
+
+"""
+import hashlib
+
+from alembic import op
+import orjson
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cb5bd0b20157'
+down_revision = '33c400eb7ac1'
+branch_labels = None
+depends_on = None
+
+TABLES = ['cache_info', 'cpu_info', 'os_info', 'raspberry_info', 'system_info', 'docker_info']
+
+# The columns that make up the content of every table, typed like the models, so that the hashes computed here
+# match the ones the service computes from the properties runners report.
+cache_info = sa.table(
+    'cache_info',
+    sa.column('id', sa.Integer()),
+    sa.column('hash', sa.String()),
+    sa.column('l1d', sa.Integer()),
+    sa.column('l1i', sa.Integer()),
+    sa.column('l2', sa.Integer()),
+    sa.column('l3', sa.Integer()),
+)
+cpu_info = sa.table(
+    'cpu_info',
+    sa.column('id', sa.Integer()),
+    sa.column('hash', sa.String()),
+    sa.column('manufacturer', sa.String()),
+    sa.column('brand', sa.String()),
+    sa.column('vendor', sa.String()),
+    sa.column('family', sa.String()),
+    sa.column('model', sa.String()),
+    sa.column('stepping', sa.String()),
+    sa.column('revision', sa.String()),
+    sa.column('voltage', sa.String()),
+    sa.column('speed', sa.Float()),
+    sa.column('speedMin', sa.Float()),
+    sa.column('speedMax', sa.Float()),
+    sa.column('governor', sa.String()),
+    sa.column('cores', sa.Integer()),
+    sa.column('physicalCores', sa.Integer()),
+    sa.column('efficiencyCores', sa.Integer()),
+    sa.column('performanceCores', sa.Integer()),
+    sa.column('processors', sa.Integer()),
+    sa.column('socket', sa.String()),
+    sa.column('flags', sa.String()),
+    sa.column('virtualization', sa.Boolean()),
+    sa.column('cache_id', sa.Integer()),
+)
+os_info = sa.table(
+    'os_info',
+    sa.column('id', sa.Integer()),
+    sa.column('hash', sa.String()),
+    sa.column('platform', sa.String()),
+    sa.column('distro', sa.String()),
+    sa.column('release', sa.String()),
+    sa.column('codename', sa.String()),
+    sa.column('kernel', sa.String()),
+    sa.column('arch', sa.String()),
+    sa.column('codepage', sa.String()),
+    sa.column('logofile', sa.String()),
+    sa.column('build', sa.String()),
+    sa.column('servicepack', sa.String()),
+    sa.column('uefi', sa.Boolean()),
+    sa.column('hypervisor', sa.Boolean()),
+    sa.column('remoteSession', sa.Boolean()),
+)
+raspberry_info = sa.table(
+    'raspberry_info',
+    sa.column('id', sa.Integer()),
+    sa.column('hash', sa.String()),
+    sa.column('manufacturer', sa.String()),
+    sa.column('processor', sa.String()),
+    sa.column('type', sa.String()),
+    sa.column('revision', sa.String()),
+)
+system_info = sa.table(
+    'system_info',
+    sa.column('id', sa.Integer()),
+    sa.column('hash', sa.String()),
+    sa.column('manufacturer', sa.String()),
+    sa.column('model', sa.String()),
+    sa.column('version', sa.String()),
+    sa.column('sku', sa.String()),
+    sa.column('virtual', sa.Boolean()),
+    sa.column('virtualHost', sa.String()),
+    sa.column('raspberry_id', sa.Integer()),
+)
+docker_info = sa.table(
+    'docker_info',
+    sa.column('id', sa.Integer()),
+    sa.column('hash', sa.String()),
+    sa.column('kernelVersion', sa.String()),
+    sa.column('operatingSystem', sa.String()),
+    sa.column('osVersion', sa.String()),
+    sa.column('osType', sa.String()),
+    sa.column('architecture', sa.String()),
+    sa.column('ncpu', sa.Integer()),
+    sa.column('memTotal', sa.Integer()),
+    sa.column('serverVersion', sa.String()),
+)
+clients = sa.table(
+    'clients',
+    sa.column('system_id', sa.Integer()),
+    sa.column('os_id', sa.Integer()),
+    sa.column('cpu_id', sa.Integer()),
+    sa.column('docker_id', sa.Integer()),
+)
+
+
+def _deduplicate(table, references, nested=None):
+    """
+    Hash every row of `table`, and merge rows with the same contents into the one with the lowest id.
+    `references` are the (table, column) pairs that refer to `table`, `nested` maps the name of a nested
+    object to its foreign key column and the contents of the rows it refers to.
+    Returns the contents of every remaining row by id.
+    """
+
+    nested = nested or {}
+    foreign_keys = {column for column, _ in nested.values()}
+    connection = op.get_bind()
+
+    contents = {}
+    kept = {}
+    for row in connection.execute(sa.select(table).order_by(table.c.id)).mappings().fetchall():
+        content = {key: value for key, value in row.items() if key not in ('id', 'hash') and key not in foreign_keys}
+        for name, (column, nested_contents) in nested.items():
+            content[name] = nested_contents.get(row[column])
+        digest = hashlib.sha256(orjson.dumps(content, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+        if digest in kept:
+            for referrer, column in references:
+                connection.execute(
+                    referrer.update().where(referrer.c[column] == row['id']).values({column: kept[digest]})
+                )
+            connection.execute(table.delete().where(table.c.id == row['id']))
+            continue
+
+        kept[digest] = row['id']
+        contents[row['id']] = content
+        connection.execute(table.update().where(table.c.id == row['id']).values(hash=digest))
+
+    return contents
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('hash', sa.String(length=64), nullable=True))
+
+    raspberries = _deduplicate(raspberry_info, [(system_info, 'raspberry_id')])
+    caches = _deduplicate(cache_info, [(cpu_info, 'cache_id')])
+    _deduplicate(system_info, [(clients, 'system_id')], {'raspberry': ('raspberry_id', raspberries)})
+    _deduplicate(cpu_info, [(clients, 'cpu_id')], {'cache': ('cache_id', caches)})
+    _deduplicate(os_info, [(clients, 'os_id')])
+    _deduplicate(docker_info, [(clients, 'docker_id')])
+
+    for table in TABLES:
+        op.create_index(op.f(f'ix_{table}_hash'), table, ['hash'], unique=True)
+
+
+def downgrade():
+    # Runners keep sharing the deduplicated rows.
+    for table in TABLES:
+        op.drop_index(op.f(f'ix_{table}_hash'), table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('hash')
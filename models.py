@@ -1,4 +1,6 @@
-from typing import Optional, Dict, List
+import enum
+from datetime import datetime
+from typing import Optional, Dict, List, Any
 from typing_extensions import Annotated
 
 from pydantic import BaseModel, Field
@@ -123,6 +125,8 @@ class ClientMeta(BaseModel):
 
 
 class Result(BaseModel):
+    id: Optional[int]
+    "The client MUST NOT submit this value, it will be ignored."
     implementation: str
     solution: str
     label: str
@@ -130,21 +134,50 @@ class Result(BaseModel):
     duration: float
     threads: int
     tags: Dict[str, str]
+    run_id: Optional[str] = Field(None, max_length=64)
+    "Identifies the benchmark run the result is part of. Results of a batch without one share a generated id."
+    idempotency_key: Optional[str] = Field(None, max_length=64)
+    "Identifies the submission, so that retries aren't stored twice. Defaults to a hash of the result and its run id."
     client_id: Optional[int]
     "The client MUST NOT submit this value, it will be ignored."
+    submitted_at: Optional[datetime]
+    "The client MUST NOT submit this value, it will be ignored."
 
     class Config:
         orm_mode = True
         title = "Result"
 
 
+class ResultSummary(BaseModel):
+    count: int
+    last_result_id: Optional[int]
+    last_submitted_at: Optional[datetime]
+    best_passes_per_second: Dict[str, float] = {}
+    "Best passes per second of every implementation the runner ran."
+
+    class Config:
+        title = "Result Summary"
+
+
+class RunnerResults(str, enum.Enum):
+    full = "full"
+    "Include every result of every runner."
+    summary = "summary"
+    "Only include the number of results, the latest one, and the best passes per second of every implementation."
+    none = "none"
+    "Leave out results."
+
+
 class Client(BaseModel):
     id: int
     token: str
 
     owner: Admin
 
-    results: List[Result]
+    results: Optional[List[Result]]
+    "Only set when results are requested in full."
+    result_summary: Optional[ResultSummary]
+    "Only set when a summary of the results is requested."
 
     cpu: Optional[CpuInfo]
     os: Optional[OsInfo]
@@ -154,3 +187,185 @@ class Client(BaseModel):
     class Config:
         orm_mode = True
         title = "Client"
+
+
+class BatchItemStatus(BaseModel):
+    index: int
+    "Position of the result in the submitted batch."
+    accepted: bool
+    errors: Optional[List[Dict[str, Any]]]
+    "Validation errors, for rejected results."
+
+    class Config:
+        title = "Batch Item Status"
+
+
+class BatchStatus(BaseModel):
+    accepted: int
+    rejected: int
+    items: List[BatchItemStatus]
+    ingest_id: Optional[str]
+    "When results are queued, the id the accepted results were queued under."
+
+    class Config:
+        title = "Batch Status"
+
+
+class JobStatus(str, enum.Enum):
+    pending = "pending"
+    "Waiting for a runner."
+    leased = "leased"
+    "Being run by a runner, which has to send heartbeats to keep its lease."
+    done = "done"
+    failed = "failed"
+    "Failed, or lost its lease, on every attempt."
+
+
+class JobRequest(BaseModel):
+    implementation: str
+    solution: Optional[str]
+    arguments: Dict[str, str] = {}
+    threads: int = Field(1, ge=1)
+    "Number of CPUs the job occupies. Only runners with at least this many CPUs free are given the job."
+    architecture: Optional[str]
+    "Architecture the job must run on, e.g. `x86_64` or `aarch64`. Any, when not given."
+    priority: int = 0
+    "Jobs with a higher priority are handed out first."
+    max_attempts: int = Field(3, ge=1)
+
+    class Config:
+        title = "Job Request"
+
+
+class Job(JobRequest):
+    id: int
+    run_id: str
+    "Run id the runner MUST submit the results of the job with."
+    status: JobStatus
+    attempts: int
+    error: Optional[str]
+    client_id: Optional[int]
+    lease_expires_at: Optional[datetime]
+    created_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    class Config:
+        orm_mode = True
+        title = "Job"
+
+
+class JobOutcome(BaseModel):
+    success: bool = True
+    error: Optional[str]
+    "What went wrong, when the job failed. A failed job is retried while it has attempts left."
+
+    class Config:
+        title = "Job Outcome"
+
+
+class RemovedRunners(BaseModel):
+    removed: int
+    "Number of runners removed, with their results."
+
+    class Config:
+        title = "Removed Runners"
+
+
+class ArchiveStatus(BaseModel):
+    archived: int
+    "Number of results moved out of the database."
+    files: List[str]
+    "Archive files the results were appended to."
+
+    class Config:
+        title = "Archive Status"
+
+
+class PublishedResult(BaseModel):
+    id: int
+    replayed: bool
+    "Whether the result had been published before, with the same idempotency key, and was not stored again."
+
+    class Config:
+        title = "Published Result"
+
+
+class IngestReceipt(BaseModel):
+    ingest_id: str
+    "Id under which the result was queued, to be stored shortly."
+
+    class Config:
+        title = "Ingest Receipt"
+
+
+class LeaderboardEntry(BaseModel):
+    implementation: str
+    solution: str
+    label: str
+    threads: int
+    cpu_brand: str
+    architecture: str
+    result_count: int
+    best_passes_per_second: Optional[float]
+    best_result_id: Optional[int]
+    mean_passes_per_second: float
+    stddev_passes_per_second: float
+    median_passes_per_second: Optional[float]
+    "Estimated, within about 2%."
+    p90_passes_per_second: Optional[float]
+    "Estimated, within about 2%."
+    p99_passes_per_second: Optional[float]
+    "Estimated, within about 2%."
+
+    class Config:
+        title = "Leaderboard Entry"
+
+
+class LeaderboardOrder(str, enum.Enum):
+    best = "best"
+    mean = "mean"
+    count = "count"
+
+
+class Distribution(BaseModel):
+    count: int
+    "Number of results with a positive number of passes and duration."
+    mean: Optional[float]
+    stddev: Optional[float]
+    min: Optional[float]
+    p10: Optional[float]
+    median: Optional[float]
+    median_low: Optional[float]
+    "Lower bound of the confidence interval of the median."
+    median_high: Optional[float]
+    "Upper bound of the confidence interval of the median."
+    p90: Optional[float]
+    max: Optional[float]
+    histogram: List[int]
+    "Number of results in each of the bins of the comparison."
+
+    class Config:
+        title = "Distribution of Passes per Second"
+
+
+class Comparison(BaseModel):
+    a: Distribution
+    b: Distribution
+    bins: List[float]
+    "Edges of the logarithmic histogram bins, in passes per second, shared by both distributions."
+    confidence: float
+    median_ratio: Optional[float]
+    "Median passes per second of b, divided by that of a."
+    median_ratio_low: Optional[float]
+    median_ratio_high: Optional[float]
+    mann_whitney_u: Optional[float]
+    "Mann-Whitney U statistic of b."
+    z: Optional[float]
+    "Normal approximation of U, corrected for ties and continuity. Positive when b tends to be faster."
+    p_value: Optional[float]
+    "Two-sided probability of a difference at least this large, if a and b were equally fast."
+    probability_b_faster: Optional[float]
+    "Probability that a random result of b is faster than a random result of a, counting ties as half."
+
+    class Config:
+        title = "Comparison"
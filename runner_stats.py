@@ -0,0 +1,106 @@
+from typing import List, Dict, Any, Tuple, Optional, Collection
+
+from sqlalchemy import select, update, delete, case, func, cast, Float
+from sqlalchemy.orm import Session
+
+from db import conflict_insert
+from dbmodels import Client, Result, RunnerBest
+from leaderboard import passes_per_second
+
+
+def _greatest(column, value):
+    # GREATEST is not available on SQLite, and MAX() with two arguments is not available elsewhere.
+    return case((column > value, column), else_=value)
+
+
+def _record_bests(db: Session, client_id: int, bests: Dict[str, Tuple[float, int]]):
+    rows = [
+        {"client_id": client_id, "implementation": implementation, "best_passes_per_second": value,
+         "best_result_id": result_id}
+        for implementation, (value, result_id) in sorted(bests.items())
+    ]
+
+    statement = conflict_insert(db.bind.dialect.name, RunnerBest)
+    if statement is not None:
+        better = statement.excluded.best_passes_per_second > RunnerBest.best_passes_per_second
+        db.execute(statement.values(rows).on_conflict_do_update(
+            index_elements=[RunnerBest.client_id, RunnerBest.implementation],
+            set_={
+                "best_passes_per_second": case(
+                    (better, statement.excluded.best_passes_per_second), else_=RunnerBest.best_passes_per_second
+                ),
+                "best_result_id": case((better, statement.excluded.best_result_id), else_=RunnerBest.best_result_id),
+            },
+        ))
+        return
+
+    existing = {
+        best.implementation: best
+        for best in db.execute(select(RunnerBest).where(
+            RunnerBest.client_id == client_id, RunnerBest.implementation.in_(bests.keys())
+        ).with_for_update()).scalars()
+    }
+    for row in rows:
+        best = existing.get(row["implementation"])
+        if best is None:
+            db.add(RunnerBest(**row))
+        elif row["best_passes_per_second"] > best.best_passes_per_second:
+            best.best_passes_per_second = row["best_passes_per_second"]
+            best.best_result_id = row["best_result_id"]
+
+
+def record_results(db: Session, client_id: int, results: List[Dict[str, Any]]):
+    """
+    Account inserted results of a runner, given as mappings that include their id, in the runner's counters and
+    best passes per second. This is meant to run in the transaction that inserts the results.
+    """
+
+    last = max(results, key=lambda result: result["id"])
+    db.execute(update(Client).where(Client.id == client_id).values(
+        result_count=Client.result_count + len(results),
+        last_result_id=_greatest(Client.last_result_id, last["id"]),
+        # Without an explicit submission time, results are stamped by the database.
+        last_submitted_at=_greatest(Client.last_submitted_at, last.get("submitted_at", func.now())),
+    ))
+
+    bests: Dict[str, Tuple[float, int]] = {}
+    for result in results:
+        value = passes_per_second(result["passes"], result["duration"])
+        if value is not None and (result["implementation"] not in bests or value > bests[result["implementation"]][0]):
+            bests[result["implementation"]] = (value, result["id"])
+    if bests:
+        _record_bests(db, client_id, bests)
+
+
+def rebuild(db: Session, client_ids: Optional[Collection[int]] = None):
+    """
+    Recompute the counters and best passes per second of all runners, or of the given ones, from their results,
+    e.g. after results have been archived.
+    """
+
+    runners, results, bests = [], [], []
+    if client_ids is not None:
+        runners = [Client.id.in_(client_ids)]
+        results = [Result.client_id.in_(client_ids)]
+        bests = [RunnerBest.client_id.in_(client_ids)]
+
+    db.execute(update(Client).where(*runners).values(
+        result_count=select(func.count(Result.id)).where(Result.client_id == Client.id).scalar_subquery(),
+        last_result_id=select(func.max(Result.id)).where(Result.client_id == Client.id).scalar_subquery(),
+        last_submitted_at=select(func.max(Result.submitted_at)).where(Result.client_id == Client.id).scalar_subquery(),
+    ).execution_options(synchronize_session=False))
+
+    db.execute(delete(RunnerBest).where(*bests))
+    value = cast(Result.passes, Float) / Result.duration
+    db.execute(RunnerBest.__table__.insert().from_select(
+        ["client_id", "implementation", "best_passes_per_second", "best_result_id"],
+        select(Result.client_id, Result.implementation, func.max(value), func.max(Result.id))
+        .where(Result.client_id.isnot(None), Result.passes > 0, Result.duration > 0, *results)
+        .group_by(Result.client_id, Result.implementation),
+    ))
+    # The best result can only be looked up once the best value is known, the first one with that value is taken.
+    db.execute(update(RunnerBest).where(*bests).values(best_result_id=select(func.min(Result.id)).where(
+        Result.client_id == RunnerBest.client_id,
+        Result.implementation == RunnerBest.implementation,
+        value == RunnerBest.best_passes_per_second,
+    ).scalar_subquery()).execution_options(synchronize_session=False))
@@ -0,0 +1,61 @@
+from typing import Any, Dict, List, Sequence
+
+import orjson
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from dbmodels import Result, ResultTag
+
+# The columns of `models.Result`, in its field order, except for the tags, which live in their own table.
+RESULT_COLUMNS = [
+    Result.id,
+    Result.implementation,
+    Result.solution,
+    Result.label,
+    Result.passes,
+    Result.duration,
+    Result.threads,
+    Result.run_id,
+    Result.client_id,
+    Result.submitted_at,
+]
+RESULT_FIELDS = [column.key for column in RESULT_COLUMNS]
+
+
+def result_query() -> Select:
+    return select(*RESULT_COLUMNS)
+
+
+async def result_tags(db: AsyncSession, result_ids: Sequence[int]) -> Dict[int, Dict[str, str]]:
+    tags = {result_id: {} for result_id in result_ids}
+    if tags:
+        query = select(ResultTag.result_id, ResultTag.key, ResultTag.value).where(ResultTag.result_id.in_(tags.keys()))
+        for result_id, key, value in await db.execute(query):
+            tags[result_id][key] = value
+    return tags
+
+
+async def result_dicts(db: AsyncSession, rows: Sequence[Any]) -> List[Dict[str, Any]]:
+    """
+    Turn rows selected with `result_query` into dictionaries shaped like `models.Result`, without constructing
+    ORM objects or models for every row. Tags are fetched with a single query.
+    """
+
+    tags = await result_tags(db, [row[0] for row in rows])
+    return [{**dict(zip(RESULT_FIELDS, row)), "tags": tags[row[0]]} for row in rows]
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.dict()
+    raise TypeError
+
+
+def dumps(payload: Any) -> bytes:
+    """
+    Serialize to JSON with orjson. Pydantic models are serialized as their `dict()`, plain data directly.
+    """
+
+    return orjson.dumps(payload, default=_default)
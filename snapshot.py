@@ -0,0 +1,249 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from typing import Dict, List, Any, Optional, AsyncIterator
+
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from dbmodels import Result, DataVersion
+from versioning import current_version
+
+# The columns of the snapshot, with their types. Missing numbers are stored as 0, or NaN for durations.
+NUMERIC_COLUMNS = {
+    "id": np.int64,
+    "client_id": np.int64,
+    "passes": np.int64,
+    "duration": np.float64,
+    "threads": np.int32,
+    "submitted_at": np.dtype("datetime64[us]"),
+}
+# String columns are stored as int32 codes into a dictionary of their distinct values, -1 standing for none.
+STRING_COLUMNS = ["implementation", "solution", "label"]
+COLUMNS = list(NUMERIC_COLUMNS) + STRING_COLUMNS
+
+# Number of results read from the database at a time.
+CHUNK_SIZE = 10000
+
+MANIFEST = "manifest.json"
+
+
+def _dtype(column: str) -> np.dtype:
+    return np.dtype(NUMERIC_COLUMNS.get(column, np.int32)).newbyteorder("<")
+
+
+class ResultSnapshot:
+    """
+    A read-only columnar copy of the results table, as of a data version, whose columns are memory-mapped
+    NumPy arrays.
+    """
+
+    def __init__(self, directory: str, manifest: Dict[str, Any]):
+        self.version: int = manifest["version"]
+        self.rows: int = manifest["rows"]
+        self.last_id: int = manifest["last_id"]
+        self.generation: str = manifest["generation"]
+        # Snapshots written before deletions were counted have none, and are rebuilt.
+        self.deletions: Optional[int] = manifest.get("deletions")
+        self.dictionaries: Dict[str, List[str]] = manifest["dictionaries"]
+
+        self.columns: Dict[str, np.ndarray] = {}
+        for column in COLUMNS:
+            if self.rows:
+                path = os.path.join(directory, self.generation, f"{column}.bin")
+                self.columns[column] = np.memmap(path, dtype=_dtype(column), mode="r", shape=(self.rows,))
+            else:
+                self.columns[column] = np.empty(0, dtype=_dtype(column))
+
+    def code(self, column: str, value: str) -> Optional[int]:
+        """
+        The code of a string value in a dictionary-encoded column, or None if no result has it.
+        """
+
+        try:
+            return self.dictionaries[column].index(value)
+        except ValueError:
+            return None
+
+
+def _load(directory: str) -> Optional[ResultSnapshot]:
+    try:
+        with open(os.path.join(directory, MANIFEST)) as file:
+            manifest = json.load(file)
+    except FileNotFoundError:
+        return None
+    return ResultSnapshot(directory, manifest)
+
+
+def _encode(rows: List[Any], dictionaries: Dict[str, List[str]], codes: Dict[str, Dict[str, int]]) -> Dict[str, bytes]:
+    chunks = {}
+    for column in NUMERIC_COLUMNS:
+        values = [getattr(row, column) for row in rows]
+        if column == "duration":
+            array = np.array([np.nan if value is None else value for value in values], dtype=_dtype(column))
+        elif column == "submitted_at":
+            array = np.array(values, dtype=_dtype(column))
+        else:
+            array = np.array([value or 0 for value in values], dtype=_dtype(column))
+        chunks[column] = array.tobytes()
+
+    for column in STRING_COLUMNS:
+        column_codes = codes[column]
+        encoded = np.empty(len(rows), dtype=_dtype(column))
+        for index, row in enumerate(rows):
+            value = getattr(row, column)
+            if value is None:
+                encoded[index] = -1
+                continue
+            code = column_codes.get(value)
+            if code is None:
+                code = column_codes[value] = len(dictionaries[column])
+                dictionaries[column].append(value)
+            encoded[index] = code
+        chunks[column] = encoded.tobytes()
+
+    return chunks
+
+
+def _append(directory: str, generation: str, sizes: Dict[str, int], chunks: Dict[str, bytes]):
+    for column, data in chunks.items():
+        with open(os.path.join(directory, generation, f"{column}.bin"), "r+b") as file:
+            # Drop anything an interrupted refresh appended past what the manifest covers. Mapped readers
+            # only ever see the rows the manifest covers, so this never pulls data out from under them.
+            file.truncate(sizes[column])
+            file.seek(sizes[column])
+            file.write(data)
+        sizes[column] += len(data)
+
+
+def _create(directory: str) -> str:
+    generation = uuid.uuid4().hex
+    os.makedirs(os.path.join(directory, generation))
+    for column in COLUMNS:
+        open(os.path.join(directory, generation, f"{column}.bin"), "wb").close()
+    return generation
+
+
+def _commit(directory: str, manifest: Dict[str, Any], previous: Optional[str]):
+    for column in COLUMNS:
+        with open(os.path.join(directory, manifest["generation"], f"{column}.bin"), "rb+") as file:
+            os.fsync(file.fileno())
+
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".tmp", "w") as file:
+        json.dump(manifest, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(path + ".tmp", path)
+
+    if previous is not None and previous != manifest["generation"]:
+        # Readers still mapping the previous generation keep their view, the files only go once unmapped.
+        shutil.rmtree(os.path.join(directory, previous), ignore_errors=True)
+
+
+class SnapshotStore:
+    """
+    Maintains the snapshot of the results table in a directory, which every worker process needs its own of.
+
+    The snapshot is brought up to date on demand. New results are appended to its columns, which only needs
+    the results since the last refresh. When results were deleted, which the deletion counter of the data
+    version tells, or committed out of id order, which shows as a different number of results up to the last
+    one in the snapshot, it is rebuilt into a new generation of files instead.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._snapshot: Optional[ResultSnapshot] = None
+        self._loaded = False
+        self._lock = asyncio.Lock()
+
+    async def current(self, db: AsyncSession) -> ResultSnapshot:
+        """
+        The snapshot as of the current data version, or a later one.
+        """
+
+        version = await current_version(db) or 0
+        async with self._lock:
+            if not self._loaded:
+                self._snapshot = await asyncio.to_thread(_load, self.directory)
+                self._loaded = True
+            if self._snapshot is None or self._snapshot.version < version:
+                self._snapshot = await self._refresh(db, version)
+            return self._snapshot
+
+    async def _refresh(self, db: AsyncSession, version: int) -> ResultSnapshot:
+        deletions = (await db.execute(
+            select(DataVersion.result_deletions).where(DataVersion.id == 1)
+        )).scalar_one_or_none() or 0
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.deletions != deletions:
+            snapshot = None
+        if snapshot is not None:
+            count = (await db.execute(select(func.count(Result.id)).where(Result.id <= snapshot.last_id))).scalar_one()
+            if count != snapshot.rows:
+                snapshot = None
+
+        if snapshot is None:
+            previous = self._snapshot.generation if self._snapshot is not None else None
+            generation = await asyncio.to_thread(_create, self.directory)
+            rows, last_id, dictionaries = 0, 0, {column: [] for column in STRING_COLUMNS}
+        else:
+            previous = generation = snapshot.generation
+            rows, last_id = snapshot.rows, snapshot.last_id
+            dictionaries = {column: list(values) for column, values in snapshot.dictionaries.items()}
+
+        codes = {column: {value: code for code, value in enumerate(values)} for column, values in dictionaries.items()}
+        sizes = {column: rows * _dtype(column).itemsize for column in COLUMNS}
+        query = select(Result.id, Result.client_id, Result.passes, Result.duration, Result.threads,
+                       Result.submitted_at, *(getattr(Result, column) for column in STRING_COLUMNS))
+
+        while True:
+            chunk = (await db.execute(query.where(Result.id > last_id).order_by(Result.id).limit(CHUNK_SIZE))).all()
+            if not chunk:
+                break
+            chunks = _encode(chunk, dictionaries, codes)
+            await asyncio.to_thread(_append, self.directory, generation, sizes, chunks)
+            rows += len(chunk)
+            last_id = chunk[-1].id
+
+        manifest = {
+            "version": version, "rows": rows, "last_id": last_id, "generation": generation, "deletions": deletions,
+            "dictionaries": dictionaries,
+        }
+        await asyncio.to_thread(_commit, self.directory, manifest, previous)
+        return ResultSnapshot(self.directory, manifest)
+
+
+def _write_npz(snapshot: ResultSnapshot) -> Any:
+    file = tempfile.TemporaryFile()
+    arrays = dict(snapshot.columns)
+    for column in STRING_COLUMNS:
+        arrays[f"{column}_values"] = np.array(snapshot.dictionaries[column], dtype=str)
+    np.savez(file, **arrays)
+    file.seek(0)
+    return file
+
+
+async def npz_chunks(snapshot: ResultSnapshot, chunk_size: int = 1 << 20) -> AsyncIterator[bytes]:
+    """
+    The snapshot as an uncompressed NumPy `.npz` archive, with an array per column, and for string columns,
+    their codes and an array of the values they stand for, e.g. `implementation` and `implementation_values`.
+    """
+
+    file = await asyncio.to_thread(_write_npz, snapshot)
+    try:
+        while True:
+            chunk = await asyncio.to_thread(file.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
+
+
+snapshot_store = SnapshotStore(settings.snapshot_directory) if settings.snapshot_directory else None
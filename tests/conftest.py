@@ -0,0 +1,71 @@
+import base64
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The database must be configured before the application modules are imported.
+_directory = tempfile.TemporaryDirectory()
+os.environ["AGGREGATOR_DATABASE_URL"] = f"sqlite:///{_directory.name}/test.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+
+import main  # noqa: E402
+from auth import admin_cache, client_cache  # noqa: E402
+from db import Base, sync_url  # noqa: E402
+from dbmodels import Admin, DataVersion  # noqa: E402
+from versioning import response_cache  # noqa: E402
+
+ADMIN = {"Authorization": "Basic " + base64.b64encode(b"admin:admin").decode()}
+
+META = {
+    "cpu": {
+        "manufacturer": "AMD", "brand": "Ryzen 9 5950X", "vendor": "AuthenticAMD", "family": "25", "model": "33",
+        "speed": 3.4, "speedMax": 4.9, "cores": 32, "physicalCores": 16, "processors": 1, "flags": "sse sse2 avx2",
+        "virtualization": True, "cache": {"l1d": 524288, "l1i": 524288, "l2": 8388608, "l3": 67108864},
+    },
+    "os": {
+        "platform": "linux", "distro": "Ubuntu", "release": "20.04", "kernel": "5.4.0", "arch": "x64",
+        "codepage": "UTF-8", "logofile": "ubuntu", "build": "", "uefi": True,
+    },
+    "system": {"manufacturer": "ASUS", "model": "System Product Name", "virtual": False, "raspberry": None},
+    "docker": {
+        "kernelVersion": "5.4.0", "operatingSystem": "Docker Desktop", "osVersion": "20.04", "osType": "linux",
+        "architecture": "x86_64", "ncpu": 32, "memTotal": 67108864, "serverVersion": "20.10.7",
+    },
+}
+
+
+def result(**fields):
+    return {
+        "implementation": "c", "solution": "1", "label": "base", "passes": 5000, "duration": 5.0, "threads": 1,
+        "tags": {"algorithm": "base", "faithful": "yes"}, **fields,
+    }
+
+
+@pytest.fixture
+def client():
+    engine = create_engine(sync_url(os.environ["AGGREGATOR_DATABASE_URL"]))
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(Admin.__table__.insert().values(username="admin", password_hash="{admin"))
+        connection.execute(DataVersion.__table__.insert().values(id=1, version=1))
+    engine.dispose()
+
+    # Data versions start over with every database, so cached responses would be served for the wrong one.
+    for cache in (response_cache, client_cache, admin_cache):
+        cache.clear()
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def add_runner(client: TestClient, meta=None) -> dict:
+    token = client.post("/runners", headers=ADMIN).json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.patch("/runners", json=meta or META, headers=headers).status_code == 200
+    return headers
@@ -0,0 +1,111 @@
+import math
+
+import numpy as np
+import pytest
+
+import main
+from analysis import ResultSelector, _median_interval, _snapshot_mask, compare, mann_whitney
+from conftest import add_runner, result
+from snapshot import SnapshotStore
+from versioning import response_cache
+
+
+def selector(cpu_brand=None, architecture=None, **filters) -> ResultSelector:
+    filters = {
+        "implementation": None, "solution": None, "label": None, "threads": None, "client_id": None,
+        "run_id": None, "submitted_after": None, "submitted_before": None, "tag": None, **filters,
+    }
+    return ResultSelector(cpu_brand, architecture, **filters)
+
+
+def test_mann_whitney_matches_known_values():
+    a, b = np.array([1.0, 2.0, 3.0]), np.array([4.0, 5.0, 6.0])
+    # U is the number of pairs in which b is larger, the variance n_a n_b (n + 1) / 12.
+    assert mann_whitney(a, b) == pytest.approx((9.0, 4.0 / math.sqrt(5.25)))
+    assert mann_whitney(b, a) == pytest.approx((0.0, -4.0 / math.sqrt(5.25)))
+    interleaved = mann_whitney(np.array([1.0, 3.0, 5.0]), np.array([2.0, 4.0, 6.0]))
+    assert interleaved == pytest.approx((6.0, 1.0 / math.sqrt(5.25)))
+
+
+def test_mann_whitney_corrects_for_ties():
+    # Ranks 1, 3, 3, 3, 5: b's add up to 8. The three tied values take (3³ - 3) / (5 · 4) off n + 1.
+    u, z = mann_whitney(np.array([1.0, 2.0, 2.0]), np.array([2.0, 3.0]))
+    assert (u, z) == pytest.approx((5.0, 1.5 / math.sqrt(6 / 12 * (6 - 24 / 20))))
+
+    assert mann_whitney(np.array([2.0, 2.0]), np.array([2.0, 2.0, 2.0])) == (3.0, 0.0)
+
+
+def test_mann_whitney_of_empty_and_single_values():
+    assert mann_whitney(np.array([]), np.array([1.0])) == (0.0, 0.0)
+    assert mann_whitney(np.array([1.0]), np.array([])) == (0.0, 0.0)
+    assert mann_whitney(np.array([1.0]), np.array([2.0])) == (1.0, 0.0)
+
+
+def test_median_interval():
+    # The 95% interval of the median of 100 values spans the 40th to the 61st of them.
+    assert _median_interval(np.arange(1.0, 101.0), 1.96) == (40.0, 61.0)
+    assert _median_interval(np.array([7.0]), 1.96) == (7.0, 7.0)
+    assert _median_interval(np.array([1.0, 2.0]), 1.96) == (1.0, 2.0)
+
+
+def test_compare_with_an_empty_side():
+    comparison = compare(np.array([]), np.array([1.0, 2.0]), 0.95)
+    assert (comparison.a.count, comparison.b.count) == (0, 2)
+    assert sum(comparison.b.histogram) == 2
+    assert comparison.median_ratio is None and comparison.mann_whitney_u is None
+
+    comparison = compare(np.array([]), np.array([]), 0.95)
+    assert (comparison.a.count, comparison.b.count, comparison.bins) == (0, 0, [])
+
+
+def test_compare_single_values():
+    comparison = compare(np.array([100.0]), np.array([200.0]), 0.95)
+    assert (comparison.a.stddev, comparison.b.median_low, comparison.b.median_high) == (0.0, 200.0, 200.0)
+    assert comparison.median_ratio == comparison.median_ratio_low == comparison.median_ratio_high == 2.0
+    assert (comparison.mann_whitney_u, comparison.z, comparison.p_value) == (1.0, 0.0, 1.0)
+    assert comparison.probability_b_faster == 1.0
+
+
+def test_snapshot_mask_falls_back_for_columns_the_snapshot_lacks(client, monkeypatch, tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    monkeypatch.setattr(main, "snapshot_store", store)
+    runner = add_runner(client)
+    client.post("/results/batch", json=[result(), result(implementation="rust"), result(passes=0)], headers=runner)
+    assert client.get("/results/snapshot").status_code == 200
+    snapshot = store._snapshot
+
+    assert _snapshot_mask(snapshot, selector()).tolist() == [True, True, False]
+    assert _snapshot_mask(snapshot, selector(implementation="rust")).tolist() == [False, True, False]
+    assert _snapshot_mask(snapshot, selector(implementation="zig")).tolist() == [False, False, False]
+    assert _snapshot_mask(snapshot, selector(threads=2)).tolist() == [False, False, False]
+    for fallback in (selector(cpu_brand="Ryzen 9 5950X"), selector(architecture="x86_64"), selector(run_id="1"),
+                     selector(tag=["faithful=yes"])):
+        assert _snapshot_mask(snapshot, fallback) is None
+
+
+def test_snapshot_and_database_compare_alike(client, monkeypatch, tmp_path):
+    fast, slow = add_runner(client), add_runner(client)
+    client.post("/results/batch", json=[result(passes=passes) for passes in (900, 1000, 1000, 1200)], headers=fast)
+    client.post("/results/batch", json=[result(passes=passes) for passes in (400, 500, 1000)], headers=slow)
+    client.post("/results/batch", json=[result(implementation="rust", passes=0)], headers=slow)
+
+    def comparisons():
+        response_cache.clear()
+        return [
+            client.get("/results/compare", params=params).json()
+            for params in (
+                {"a.client_id": 2, "b.client_id": 1},
+                {"a.implementation": "c", "b.implementation": "rust"},
+                {"a.threads": 1, "b.solution": "1", "confidence": 0.8},
+            )
+        ]
+
+    monkeypatch.setattr(main, "snapshot_store", None)
+    from_database = comparisons()
+    monkeypatch.setattr(main, "snapshot_store", SnapshotStore(str(tmp_path)))
+    from_snapshot = comparisons()
+
+    assert from_snapshot == from_database
+    # Two of the fast runner's results tie with one of the slow runner's, and count half.
+    assert from_database[0]["mann_whitney_u"] == 10.0
+    assert from_database[1]["b"]["count"] == 0
@@ -0,0 +1,51 @@
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, update
+
+import main
+from conftest import ADMIN, META, add_runner, result
+from db import sync_url
+from dbmodels import Result
+
+
+def archive_first_result(client) -> int:
+    old = datetime.utcnow() - timedelta(days=400)
+    engine = create_engine(sync_url(os.environ["AGGREGATOR_DATABASE_URL"]))
+    with engine.begin() as connection:
+        connection.execute(update(Result).where(Result.id == 1).values(submitted_at=old))
+    engine.dispose()
+
+    response = client.post("/results/archive", params={"before": (old + timedelta(days=1)).isoformat()}, headers=ADMIN)
+    return response.json()["archived"]
+
+
+def test_archiving_recomputes_the_aggregates(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(main.settings, "archive_directory", str(tmp_path))
+    runner = add_runner(client)
+    client.post("/results/batch", json=[result(passes=2000), result(passes=1000)], headers=runner)
+
+    # Only the best result is old enough to be archived.
+    assert archive_first_result(client) == 1
+
+    [entry] = client.get("/leaderboard").json()
+    assert (entry["result_count"], entry["best_passes_per_second"], entry["best_result_id"]) == (1, 200.0, 2)
+    [summary] = [runner["result_summary"] for runner in client.get("/runners", headers=ADMIN).json()]
+    assert (summary["count"], summary["best_passes_per_second"]) == (1, {"c": 200.0})
+
+
+def test_archiving_recomputes_the_groups_the_results_were_submitted_in(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(main.settings, "archive_directory", str(tmp_path))
+    runner = add_runner(client)
+    client.post("/results/batch", json=[result(passes=2000), result(passes=1000)], headers=runner)
+    upgraded = {**META, "cpu": {**META["cpu"], "brand": "Ryzen 9 7950X"}}
+    assert client.patch("/runners", json=upgraded, headers=runner).status_code == 200
+    client.post("/results/batch", json=[result(passes=4000)], headers=runner)
+
+    assert archive_first_result(client) == 1
+
+    entries = sorted(
+        (entry["cpu_brand"], entry["result_count"], entry["best_result_id"])
+        for entry in client.get("/leaderboard").json()
+    )
+    assert entries == [("Ryzen 9 5950X", 1, 2), ("Ryzen 9 7950X", 1, 3)]
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+
+import db
+from config import settings
+from db import SessionLocal, engine
+from dbmodels import DataVersion
+
+
+def run(coroutine):
+    async def run_and_close():
+        try:
+            await coroutine
+        finally:
+            # Pooled connections belong to this event loop.
+            await engine.dispose()
+
+    asyncio.run(run_and_close())
+
+
+async def write(session):
+    await session.execute(update(DataVersion).where(DataVersion.id == 1).values(version=DataVersion.version + 1))
+
+
+def writer_lock() -> asyncio.Lock:
+    return db._writer_locks[asyncio.get_running_loop()]
+
+
+def test_rollback_releases_the_writer_lock(client):
+    async def roll_back():
+        async with SessionLocal() as session:
+            await write(session)
+            assert writer_lock().locked()
+            await session.rollback()
+            assert not writer_lock().locked()
+
+    run(roll_back())
+
+
+def test_failing_transaction_releases_the_writer_lock(client):
+    async def fail():
+        with pytest.raises(RuntimeError):
+            async with SessionLocal() as session:
+                await write(session)
+                raise RuntimeError("failed after writing")
+        assert not writer_lock().locked()
+
+        async with SessionLocal() as session:
+            await write(session)
+            await session.commit()
+
+    run(fail())
+
+
+def test_waiting_writer_fails_after_the_busy_timeout(client, monkeypatch):
+    monkeypatch.setattr(settings, "sqlite_busy_timeout", 100)
+
+    async def wait():
+        async with SessionLocal() as holder, SessionLocal() as waiter:
+            await write(holder)
+            with pytest.raises(OperationalError, match="database is locked"):
+                await write(waiter)
+            await waiter.rollback()
+
+            await holder.commit()
+            await write(waiter)
+            await waiter.commit()
+
+    run(wait())
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta, timezone
+
+from conftest import add_runner, result
+from feed import feed_hub
+from filters import ResultFilter
+
+
+def result_filter(**fields) -> ResultFilter:
+    parameters = dict(
+        implementation=None, solution=None, label=None, threads=None, client_id=None, run_id=None,
+        submitted_after=None, submitted_before=None, tag=None,
+    )
+    return ResultFilter(**{**parameters, **fields})
+
+
+def test_time_filtered_subscriber_receives_matching_results(client):
+    runner = add_runner(client)
+    an_hour_ago = datetime.now(timezone(timedelta(hours=2))) - timedelta(hours=1)
+
+    with feed_hub.subscribe(result_filter(submitted_after=an_hour_ago)) as recent, \
+            feed_hub.subscribe(result_filter(submitted_before=an_hour_ago)) as old:
+        assert client.post("/results", json=result(), headers=runner).status_code == 200
+        response = client.post("/results/batch", json=[result(solution="2"), result(solution="3")], headers=runner)
+        assert response.status_code == 200
+
+        assert [published["solution"] for published in recent.results] == ["1", "2", "3"]
+        assert not old.results
+
+
+def test_failing_subscriber_does_not_fail_the_submission(client, monkeypatch):
+    runner = add_runner(client)
+
+    def fail(_result):
+        raise RuntimeError("broken subscriber")
+
+    with feed_hub.subscribe(result_filter()) as subscription:
+        monkeypatch.setattr(subscription.filters, "matches", fail)
+        assert client.post("/results", json=result(), headers=runner).status_code == 200
+
+    assert len(client.get("/results").json()) == 1
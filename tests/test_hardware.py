@@ -0,0 +1,40 @@
+import asyncio
+import copy
+
+import httpx
+
+import main
+from db import engine
+from conftest import ADMIN, META, add_runner
+
+
+def meta(variant: int) -> dict:
+    properties = copy.deepcopy(META)
+    properties["cpu"]["brand"] = f"CPU {variant}"
+    properties["os"]["release"] = f"20.{variant}"
+    properties["docker"]["ncpu"] = variant + 1
+    return properties
+
+
+def test_concurrent_hardware_changes_keep_profiles_consistent(client):
+    runners = [add_runner(client, meta(index % 3)) for index in range(8)]
+
+    async def report_changes():
+        transport = httpx.ASGITransport(app=main.app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                # Every round, each runner moves to a profile another one is leaving, so pruning races with lookups.
+                for round in range(1, 6):
+                    responses = await asyncio.gather(*(
+                        http.patch("/runners", json=meta((index + round) % 3), headers=headers)
+                        for index, headers in enumerate(runners)
+                    ))
+                    assert [response.status_code for response in responses] == [200] * len(runners)
+        finally:
+            # Pooled connections belong to this event loop.
+            await engine.dispose()
+
+    asyncio.run(report_changes())
+
+    listed = client.get("/runners", headers=ADMIN).json()
+    assert [runner["cpu"]["brand"] for runner in listed] == [f"CPU {(index + 5) % 3}" for index in range(8)]
@@ -0,0 +1,84 @@
+import json
+
+from sqlalchemy import event
+
+from conftest import add_runner, result
+from db import engine
+
+
+def test_batch_inserts_results_with_a_fixed_number_of_statements(client):
+    runner = add_runner(client)
+    client.post("/results", json=result(), headers=runner)
+
+    statements = []
+
+    def count(_connection, _cursor, statement, *_):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    try:
+        batch = [result(passes=index, tags={"passes": str(index)}) for index in range(1, 101)]
+        response = client.post("/results/batch", json=batch, headers=runner)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count)
+    assert response.status_code == 200
+
+    assert len([statement for statement in statements if statement.startswith("INSERT INTO results ")]) == 1
+    assert len(statements) < 20
+
+    # Every result got its own tags, which are inserted by the ids read back.
+    published = client.get("/results", params={"limit": 200}).json()
+    assert len(published) == 101
+    assert all(row["tags"] == {"passes": str(row["passes"])} for row in published[1:])
+
+
+def stored(client) -> int:
+    return len(client.get("/results", params={"limit": 200}).json())
+
+
+def test_a_repeated_idempotency_key_returns_the_stored_result(client):
+    runner = add_runner(client)
+    first = client.post("/results", json=result(), headers={**runner, "Idempotency-Key": "attempt"}).json()
+    retried = client.post("/results", json=result(), headers={**runner, "Idempotency-Key": "attempt"}).json()
+    assert first == {"id": 1, "replayed": False}
+    assert retried == {"id": 1, "replayed": True}
+
+    # A result of a run is identified within it, without a key.
+    first = client.post("/results", json=result(run_id="run"), headers=runner).json()
+    assert client.post("/results", json=result(run_id="run"), headers=runner).json() == {**first, "replayed": True}
+    assert stored(client) == 2
+
+
+def test_a_retried_batch_stores_no_duplicates(client):
+    runner = add_runner(client)
+    batch = [result(run_id="run"), result(run_id="run", solution="2"), result(idempotency_key="key")]
+    for _ in range(2):
+        response = client.post("/results/batch", json=batch, headers=runner)
+        assert response.status_code == 200
+        assert response.json()["accepted"] == 3
+    assert stored(client) == 3
+
+
+def test_a_batch_without_a_run_id_is_not_deduplicated(client):
+    runner = add_runner(client)
+    # Each submission gets a run id of its own, so a retry can't be told apart from another run.
+    for _ in range(2):
+        assert client.post("/results/batch", json=[result(), result(solution="2")], headers=runner).status_code == 200
+    assert stored(client) == 4
+
+
+def test_a_malformed_ndjson_line_only_rejects_itself(client):
+    runner = add_runner(client)
+    body = b"\n".join([json.dumps(result()).encode(), b'{"implementation": "c", "pass', json.dumps(result()).encode()])
+    response = client.post("/results/batch", content=body, headers={**runner, "Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+
+    status = response.json()
+    assert (status["accepted"], status["rejected"]) == (2, 1)
+    assert [item["accepted"] for item in status["items"]] == [True, False, True]
+    assert status["items"][1]["errors"][0]["type"] == "value_error.jsondecode"
+    assert stored(client) == 2
+
+    # A JSON array is parsed as a whole.
+    response = client.post("/results/batch", content=body, headers={**runner, "Content-Type": "application/json"})
+    assert response.status_code == 400
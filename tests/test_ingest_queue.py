@@ -0,0 +1,108 @@
+import asyncio
+from datetime import datetime
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+import models
+from conftest import ADMIN, add_runner, result
+from db import engine
+from ingest_queue import IngestQueue
+
+
+def run(coroutine):
+    async def run_and_close():
+        try:
+            return await coroutine
+        finally:
+            # Pooled connections belong to this event loop.
+            await engine.dispose()
+
+    return asyncio.run(run_and_close())
+
+
+def entry(id: str, client_id: int, **fields) -> dict:
+    return {
+        "id": id,
+        "client_id": client_id,
+        "submitted_at": datetime.utcnow().isoformat(),
+        "results": [models.Result.parse_obj(result(**fields)).dict(exclude={"id", "client_id", "submitted_at"})],
+    }
+
+
+def journal(path) -> list:
+    return [orjson.loads(line) for line in path.read_bytes().splitlines()]
+
+
+def stored(client) -> list:
+    return sorted(row["solution"] for row in client.get("/results").json())
+
+
+def test_unfinished_submissions_are_replayed_after_a_restart(client, tmp_path):
+    add_runner(client)
+    path = tmp_path / "ingest.journal"
+    # Written by a process that stopped after storing the first submission, in the middle of a line.
+    path.write_bytes(b"".join(orjson.dumps(record) + b"\n" for record in (
+        entry("a", 1, solution="1"), entry("b", 1, solution="2"), {"done": ["a"]}, entry("c", 1, solution="3"),
+    )) + b'{"id": "d", "cli')
+
+    async def restart():
+        queue = IngestQueue(str(path), maxsize=10, batch_size=10)
+        await queue.start()
+        # Replaying compacts the journal to what is left to store.
+        assert [record["id"] for record in journal(path)] == ["b", "c"]
+        await queue.stop()
+        return queue
+
+    queue = run(restart())
+    assert queue.stored == 2
+    assert stored(client) == ["2", "3"]
+    # Once everything is stored, the journal is compacted to nothing.
+    assert journal(path) == []
+
+
+def test_submissions_are_rejected_while_the_queue_is_full(client, tmp_path):
+    add_runner(client)
+
+    async def submit():
+        queue = IngestQueue(str(tmp_path / "ingest.journal"), maxsize=1, batch_size=10)
+        await queue.start()
+        await queue.submit(1, [models.Result.parse_obj(result())])
+        with pytest.raises(HTTPException) as rejected:
+            await queue.submit(1, [models.Result.parse_obj(result(solution="2"))])
+        assert (rejected.value.status_code, rejected.value.headers) == (429, {"Retry-After": "1"})
+
+        # Once the first submission is stored, there is room again.
+        while queue.stats()["pending"]:
+            await asyncio.sleep(0.01)
+        await queue.submit(1, [models.Result.parse_obj(result(solution="3"))])
+        await queue.stop()
+        return queue
+
+    queue = run(submit())
+    assert queue.rejected == 1
+    assert stored(client) == ["1", "3"]
+
+
+def test_submissions_of_removed_runners_are_dead_lettered(client, tmp_path):
+    add_runner(client)
+    add_runner(client)
+    runner_id = client.get("/runners", headers=ADMIN).json()[1]["id"]
+    assert client.delete(f"/runners/{runner_id}", headers=ADMIN).status_code == 200
+    path = tmp_path / "ingest.journal"
+    path.write_bytes(b"".join(
+        orjson.dumps(record) + b"\n" for record in (entry("kept", 1), entry("removed", runner_id, solution="2"))
+    ))
+
+    async def restart():
+        queue = IngestQueue(str(path), maxsize=10, batch_size=10)
+        await queue.start()
+        await queue.stop()
+        return queue
+
+    queue = run(restart())
+    assert (queue.stored, queue.failed, queue.dead_lettered) == (1, 0, 1)
+    assert stored(client) == ["1"]
+    assert journal(path) == []
+    assert [record["id"] for record in journal(tmp_path / "ingest.journal.dead")] == ["removed"]
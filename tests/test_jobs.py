@@ -0,0 +1,46 @@
+import os
+
+from sqlalchemy import create_engine, delete
+
+from config import settings
+from conftest import ADMIN, add_runner
+from db import sync_url
+from dbmodels import Client
+
+
+def lease(client, runner) -> dict:
+    response = client.get("/jobs/next", params={"wait": 0}, headers=runner)
+    return response.json() if response.status_code == 200 else None
+
+
+def test_expired_leases_are_handed_out_again(client, monkeypatch):
+    # Leases expire as soon as they are handed out.
+    monkeypatch.setattr(settings, "job_lease_seconds", -1)
+    first, second = add_runner(client), add_runner(client)
+    [job] = client.post("/jobs", json=[{"implementation": "c", "max_attempts": 2}], headers=ADMIN).json()
+
+    leased = lease(client, first)
+    assert (leased["id"], leased["attempts"]) == (job["id"], 1)
+    assert client.post(f"/jobs/{job['id']}/heartbeat", headers=first).status_code == 409
+
+    leased = lease(client, second)
+    assert (leased["id"], leased["attempts"], leased["status"]) == (job["id"], 2, "leased")
+
+    # Without attempts left, the job fails once its lease expires.
+    assert lease(client, first) is None
+    [failed] = client.get("/jobs", headers=ADMIN).json()
+    assert (failed["status"], failed["error"], failed["attempts"]) == ("failed", "Lease expired", 2)
+
+
+def test_a_removed_runner_cannot_lease_jobs(client):
+    runner = add_runner(client)
+    client.post("/jobs", json=[{"implementation": "c"}], headers=ADMIN)
+    assert lease(client, runner) is not None
+
+    # Removed by another process, so that the token stays cached in this one.
+    engine = create_engine(sync_url(os.environ["AGGREGATOR_DATABASE_URL"]))
+    with engine.begin() as connection:
+        connection.execute(delete(Client))
+    engine.dispose()
+
+    assert client.get("/jobs/next", params={"wait": 0}, headers=runner).status_code == 403
@@ -0,0 +1,43 @@
+from conftest import ADMIN, META, add_runner, result
+
+
+def leaderboard(client) -> list:
+    return sorted(
+        (entry["implementation"], entry["result_count"], entry["best_passes_per_second"])
+        for entry in client.get("/leaderboard").json()
+    )
+
+
+def test_removing_a_runner_recomputes_its_groups(client):
+    kept, removed = add_runner(client), add_runner(client)
+    client.post("/results/batch", json=[result(passes=1000), result(implementation="rust")], headers=kept)
+    client.post("/results/batch", json=[result(passes=2000), result(implementation="go")], headers=removed)
+    assert leaderboard(client) == [("c", 2, 400.0), ("go", 1, 1000.0), ("rust", 1, 1000.0)]
+    # The removed runner's results stay in the groups they were submitted in, whatever hardware it has since.
+    moved = {**META, "docker": {**META["docker"], "architecture": "aarch64"}}
+    assert client.patch("/runners", json=moved, headers=removed).status_code == 200
+    assert leaderboard(client) == [("c", 2, 400.0), ("go", 1, 1000.0), ("rust", 1, 1000.0)]
+
+    runner_id = client.get("/runners", headers=ADMIN).json()[1]["id"]
+    assert client.delete(f"/runners/{runner_id}", headers=ADMIN).status_code == 200
+
+    assert leaderboard(client) == [("c", 1, 200.0), ("rust", 1, 1000.0)]
+
+
+def test_results_stay_in_the_group_of_the_hardware_they_were_submitted_on(client):
+    runner = add_runner(client)
+    client.post("/results/batch", json=[result(), result(passes=2000)], headers=runner)
+    upgraded = {**META, "cpu": {**META["cpu"], "brand": "Ryzen 9 7950X"}}
+    assert client.patch("/runners", json=upgraded, headers=runner).status_code == 200
+    client.post("/results/batch", json=[result(passes=8000)], headers=runner)
+
+    def groups():
+        return sorted((entry["cpu_brand"], entry["result_count"]) for entry in client.get("/leaderboard").json())
+
+    assert groups() == [("Ryzen 9 5950X", 2), ("Ryzen 9 7950X", 1)]
+    assert client.post("/leaderboard/rebuild", headers=ADMIN).status_code == 200
+    assert groups() == [("Ryzen 9 5950X", 2), ("Ryzen 9 7950X", 1)]
+
+    runner_id = client.get("/runners", headers=ADMIN).json()[0]["id"]
+    assert client.delete(f"/runners/{runner_id}", headers=ADMIN).status_code == 200
+    assert groups() == []
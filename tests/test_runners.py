@@ -0,0 +1,17 @@
+from conftest import ADMIN, add_runner, result
+
+
+def test_registering_and_rotating_a_token_return_a_result_summary(client):
+    registered = client.post("/runners", headers=ADMIN).json()
+    assert registered["results"] is None
+    assert registered["result_summary"]["count"] == 0
+
+    runner = add_runner(client)
+    client.post("/results/batch", json=[result(), result(implementation="rust")], headers=runner)
+    runner_id = client.get("/runners", headers=ADMIN).json()[1]["id"]
+    rotated = client.post(f"/runners/{runner_id}/token", headers=ADMIN).json()
+    assert rotated["results"] is None
+    assert rotated["result_summary"]["count"] == 2
+
+    new_runner = {"Authorization": f"Bearer {rotated['token']}"}
+    assert client.post("/results/batch", json=[result()], headers=new_runner).status_code == 200
@@ -0,0 +1,28 @@
+import io
+
+import numpy as np
+
+import main
+from conftest import ADMIN, add_runner, result
+from snapshot import SnapshotStore
+
+
+def snapshot_ids(client) -> list:
+    response = client.get("/results/snapshot")
+    assert response.status_code == 200
+    return np.load(io.BytesIO(response.content))["id"].tolist()
+
+
+def test_snapshot_drops_the_results_of_removed_runners(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "snapshot_store", SnapshotStore(str(tmp_path)))
+    kept, removed = add_runner(client), add_runner(client)
+    client.post("/results/batch", json=[result(), result(solution="2")], headers=kept)
+    client.post("/results", json=result(solution="3"), headers=removed)
+    assert snapshot_ids(client) == [1, 2, 3]
+
+    runner_id = client.get("/runners", headers=ADMIN).json()[1]["id"]
+    assert client.delete(f"/runners/{runner_id}", headers=ADMIN).status_code == 200
+    # The id of the removed result is not handed out again.
+    assert client.post("/results", json=result(solution="4"), headers=kept).json()["id"] == 4
+
+    assert snapshot_ids(client) == [1, 2, 4]
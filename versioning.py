@@ -0,0 +1,70 @@
+from typing import Callable, Awaitable, Tuple, Any, Dict, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.status import HTTP_304_NOT_MODIFIED
+
+from cache import TTLCache
+from config import settings
+from dbmodels import DataVersion
+from serialization import dumps
+
+# Executed by every transaction that changes what the read endpoints return, before it commits.
+bump_version = update(DataVersion).where(DataVersion.id == 1).values(version=DataVersion.version + 1)
+# Executed instead by transactions that delete results.
+bump_deletions = update(DataVersion).where(DataVersion.id == 1).values(
+    version=DataVersion.version + 1, result_deletions=DataVersion.result_deletions + 1,
+)
+
+# Serialized response bodies and headers, by URL and data version.
+response_cache: TTLCache[Tuple[str, int], Tuple[bytes, Dict[str, str]]] = TTLCache(
+    settings.response_cache_size, settings.response_cache_ttl
+)
+
+
+async def current_version(db: AsyncSession) -> Optional[int]:
+    return (await db.execute(select(DataVersion.version).where(DataVersion.id == 1))).scalar_one_or_none()
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    return if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+async def conditional_response(
+        request: Request,
+        db: AsyncSession,
+        render: Callable[[], Awaitable[Tuple[Any, Dict[str, str]]]]) -> Response:
+    """
+    Answer a read request from the data version: with 304 Not Modified when the client already has the current
+    representation, from the response cache when another client asked for it before, and otherwise by rendering
+    the response with `render`, which returns the payload and any extra headers.
+
+    The version is read before the data, so a representation is never older than the version it is stored under.
+    """
+
+    version = await current_version(db)
+    if version is None:
+        payload, headers = await render()
+        return Response(dumps(payload), media_type="application/json", headers=headers)
+
+    etag = f'"{version}"'
+    if _etag_matches(request, etag):
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+    key = (str(request.url), version)
+    cached = response_cache.get(key)
+    if cached is None:
+        payload, headers = await render()
+        cached = (dumps(payload), headers)
+        response_cache.set(key, cached)
+
+    body, headers = cached
+    return Response(
+        body,
+        media_type="application/json",
+        headers={**headers, "ETag": etag, "Cache-Control": "no-cache"},
+    )